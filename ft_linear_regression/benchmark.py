@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the train/evaluate/predict pipeline.
+Every (case, size) runs in a fresh process on synthetic data, so its peak RSS is its own. Wall time,
+peak RSS, the peak memory allocated by the call and iterations are appended to a JSON history keyed
+by git commit, and `compare` flags regressions between two recorded runs.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+import numpy as np
+from logging_config import configure_logging, get_logger
+
+# Setup logger for benchmark module
+logger = get_logger(__name__)
+
+HISTORY_FILE = "benchmarks.json"
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+MAX_ROWS = 100_000_000
+# Rows generated (and written to CSV) at a time, so 1e8-row datasets never exist as one temporary
+GENERATOR_CHUNK_ROWS = 1_000_000
+# The per-sample estimate_price loop is timed on at most this many rows
+LOOP_ROWS = 100_000
+THETA0, THETA1 = 9000.0, -0.02
+
+
+def iter_synthetic_chunks(n_samples, noise=500.0, offset=0.0, spread=300_000.0, seed=0, chunk_rows=GENERATOR_CHUNK_ROWS):
+    """Yield (mileage, price) chunks of a synthetic dataset; the same arguments always give the same rows.
+
+    Mileage is uniform on [offset, offset + spread] in whole km and price = θ₀ + θ₁·(mileage − offset) +
+    N(0, noise²) in cents. A large offset relative to spread makes the raw (unnormalized) problem
+    ill-conditioned without changing the prices.
+    """
+    if not 0 < n_samples <= MAX_ROWS:
+        raise ValueError(f"Synthetic datasets have 1 to {MAX_ROWS:,} rows")
+    for index, start in enumerate(range(0, n_samples, chunk_rows)):
+        rng = np.random.default_rng([seed, index])
+        size = min(chunk_rows, n_samples - start)
+        mileage = np.round(offset + rng.uniform(0.0, spread, size))
+        price = np.round(THETA0 + THETA1 * (mileage - offset) + rng.normal(0.0, noise, size), 2)
+        yield mileage, price
+
+
+def generate_data(n_samples, **options):
+    """(mileage, price) float64 arrays of a synthetic dataset (options as in iter_synthetic_chunks)."""
+    chunks = list(iter_synthetic_chunks(n_samples, **options))
+    return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+
+def write_csv(path, n_samples, **options):
+    """Write a synthetic dataset as a `km,price` CSV, chunk by chunk."""
+    from predict import _format_csv_rows
+
+    with open(path, "wb") as f:
+        f.write(b"km,price\n")
+        for mileage, price in iter_synthetic_chunks(n_samples, **options):
+            f.write(_format_csv_rows(mileage, price))
+
+
+def _memory_mb():
+    """(current RSS, peak RSS) of this process in MB; without /proc both are the getrusage peak."""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+        return peak, peak
+
+
+CASES = ("load_data", "load_data_cached", "scaler_fit_transform", "fit_gd", "fit_exact", "optimize_hyperparameters", "train_calculate_metrics", "evaluate_calculate_metrics", "estimate_price", "estimate_prices")
+
+
+def _prepare(case, data):
+    """(call, iterations) of one case: call() is timed and iterations(result) is its iteration count (None: not iterative).
+
+    data holds the mileage and price arrays, the CSV path and the dtype. Untimed setup (building the
+    binary cache, fitting the model that is scored) happens here.
+    """
+    from evaluate import calculate_metrics as evaluate_metrics
+    from train import LinearRegression, ManualScaler, calculate_metrics as train_metrics, optimize_hyperparameters
+    from utils import estimate_price, estimate_prices, load_data
+
+    x, y, csv_path, dtype = data["mileage"], data["price"], data["csv"], data["dtype"]
+    if case == "load_data":
+        return partial(load_data, csv_path, use_cache=False, dtype=dtype), None
+    if case == "load_data_cached":
+        # The first load builds the binary cache; timed loads memory-map it
+        load_data(csv_path, use_cache=True, dtype=dtype)
+        return partial(load_data, csv_path, use_cache=True, dtype=dtype), None
+    if case == "scaler_fit_transform":
+        return partial(ManualScaler().fit_transform, x), None
+    if case == "fit_gd":
+        return (lambda: LinearRegression(learning_rate=0.5).fit(x, y, verbose=False)), lambda model: len(model.cost_history)
+    if case == "fit_exact":
+        return (lambda: LinearRegression(solver="exact").fit(x, y, verbose=False)), None
+    if case == "optimize_hyperparameters":
+        return partial(optimize_hyperparameters, x, y), lambda result: len(result[1].cost_history)
+    if case == "train_calculate_metrics":
+        return partial(train_metrics, LinearRegression(solver="exact").fit(x, y, verbose=False), x, y), None
+    if case == "evaluate_calculate_metrics":
+        return partial(evaluate_metrics, x, y, THETA0, THETA1), None
+    if case == "estimate_price":
+        rows = x[:LOOP_ROWS].tolist()
+        return (lambda: [estimate_price(km, THETA0, THETA1) for km in rows]), None
+    return partial(estimate_prices, x, THETA0, THETA1), None
+
+
+def _run_case(case, n_samples, generator, csv_path, repeats, dtype):
+    """Time one case in this (fresh) process: best wall time of `repeats`, peak RSS of the process and peak allocation of one call.
+
+    The allocation peak is traced (NumPy reports its buffers to tracemalloc) on an extra, untimed call:
+    unlike RSS it does not depend on what the allocator kept from the setup, so it is what compare checks.
+    """
+    configure_logging("WARNING")
+    mileage, price = generate_data(n_samples, **generator)
+    data = {"mileage": mileage.astype(dtype), "price": price.astype(dtype), "csv": csv_path, "dtype": dtype}
+    del mileage, price
+    call, count = _prepare(case, data)
+
+    times, result = [], None
+    for _ in range(repeats):
+        # Drop the previous result first so it is not counted in the next call's peak
+        result = None
+        start = time.perf_counter()
+        result = call()
+        times.append(time.perf_counter() - start)
+    _, peak = _memory_mb()
+    iterations = None if count is None else count(result)
+
+    result = None
+    tracemalloc.start()
+    call()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    rows = min(n_samples, LOOP_ROWS) if case == "estimate_price" else n_samples
+    return {"case": case, "n_samples": n_samples, "rows": rows, "seconds": min(times), "peak_rss_mb": round(peak, 1), "peak_alloc_mb": round(allocated / 1e6, 2), "iterations": iterations}
+
+
+def git_revision():
+    """`git describe --always --dirty` of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, cases=CASES, repeats=3, dtype="float64", **generator):
+    """Run every (case, size) in its own process and return one history record with the results."""
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases: {', '.join(sorted(unknown))}")
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for n_samples in sizes:
+            csv_path = os.path.join(directory, f"data_{n_samples}.csv")
+            if {"load_data", "load_data_cached"} & set(cases):
+                write_csv(csv_path, n_samples, **generator)
+            for case in cases:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(_run_case, case, n_samples, generator, csv_path, repeats, dtype).result()
+                results.append(result)
+                _print_result(result)
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+
+    return {"revision": git_revision(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"), "python": platform.python_version(), "numpy": np.__version__, "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs", "config": {"repeats": repeats, "dtype": dtype, **generator}, "results": results}
+
+
+def _print_result(result):
+    rate = result["rows"] / result["seconds"] if result["seconds"] > 0 else float("inf")
+    iterations = "" if result["iterations"] is None else f"  {result['iterations']} iterations"
+    print(f"  {result['case']:<28} {result['n_samples']:>11,} rows  {result['seconds']:9.4f}s  ({rate:14,.0f} rows/s)  peak RSS {result['peak_rss_mb']:7.1f} MB  allocated {result['peak_alloc_mb']:9.2f} MB{iterations}")
+
+
+def load_history(path=HISTORY_FILE):
+    """Recorded runs, oldest first (empty if the file does not exist)."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def append_history(record, path=HISTORY_FILE):
+    """Append one run to the history file (rewritten atomically)."""
+    history = load_history(path) + [record]
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(temporary, path)
+    return len(history)
+
+
+def find_run(history, ref):
+    """Run selected by a negative/positive index into the history or by a git revision prefix (latest match)."""
+    try:
+        return history[int(ref)]
+    except ValueError:
+        matches = [run for run in history if (run.get("revision") or "").startswith(ref)]
+        if not matches:
+            raise ValueError(f"No recorded run for revision '{ref}'")
+        return matches[-1]
+    except IndexError:
+        raise ValueError(f"No recorded run at index {ref} ({len(history)} runs)") from None
+
+
+def compare_runs(base, head, threshold=0.10, min_seconds=1e-3, min_alloc_mb=1.0):
+    """Print base against head for every (case, size) in both and return the regressions.
+
+    A time regression is more than `threshold` slower and at least min_seconds; a memory regression is
+    a peak allocation more than `threshold` larger and at least min_alloc_mb. The floors keep timer
+    noise and small buffers on tiny inputs from being reported.
+    """
+    if base["config"] != head["config"]:
+        logger.warning(f"Runs use different settings: {base['config']} vs {head['config']}")
+    base_results = {(r["case"], r["n_samples"]): r for r in base["results"]}
+    regressions = []
+    print(f"{base['revision']} ({base['timestamp']}) -> {head['revision']} ({head['timestamp']})")
+    for result in head["results"]:
+        key = (result["case"], result["n_samples"])
+        if key not in base_results:
+            continue
+        old = base_results[key]
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        slower = ratio > 1 + threshold and result["seconds"] - old["seconds"] >= min_seconds
+        bigger = result["peak_alloc_mb"] > old["peak_alloc_mb"] * (1 + threshold) and result["peak_alloc_mb"] - old["peak_alloc_mb"] >= min_alloc_mb
+        status = "REGRESSION" if slower or bigger else ("faster" if ratio < 1 - threshold else "ok")
+        if slower or bigger:
+            regressions.append({"case": key[0], "n_samples": key[1], "time_ratio": ratio, "peak_alloc_mb": (old["peak_alloc_mb"], result["peak_alloc_mb"])})
+        print(f"  {key[0]:<28} {key[1]:>11,} rows  {old['seconds']:9.4f}s -> {result['seconds']:9.4f}s  {ratio:6.2f}x  allocated {old['peak_alloc_mb']:.2f} -> {result['peak_alloc_mb']:.2f} MB  {status}")
+    return regressions
+
+
+def parse_args(argv=None):
+    """Parse the run, compare and generate subcommands."""
+    parser = argparse.ArgumentParser(description="Benchmark the train/evaluate/predict pipeline on synthetic data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_generator_arguments(command):
+        command.add_argument("--noise", type=float, default=500.0, help="standard deviation of the price noise (default: 500)")
+        command.add_argument("--offset", type=float, default=0.0, help="smallest mileage; large values relative to --spread worsen the conditioning (default: 0)")
+        command.add_argument("--spread", type=float, default=300_000.0, help="range of the mileages in km (default: 300000)")
+        command.add_argument("--seed", type=int, default=0, help="random seed of the generator (default: 0)")
+
+    run = commands.add_parser("run", help="run the benchmarks and append the results to the history")
+    run.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="dataset sizes in rows, 1e3 to 1e8 (default: 1e3 1e4 1e5 1e6)")
+    run.add_argument("--cases", nargs="+", choices=CASES, default=CASES, metavar="CASE", help=f"cases to run (default: all of {', '.join(CASES)})")
+    run.add_argument("--repeats", type=int, default=3, help="timed calls per case; the fastest is kept (default: 3)")
+    run.add_argument("--dtype", choices=("float64", "float32"), default="float64", help="dtype of the benchmarked data (default: float64)")
+    run.add_argument("--history", default=HISTORY_FILE, help=f"JSON history file (default: {HISTORY_FILE})")
+    add_generator_arguments(run)
+
+    compare = commands.add_parser("compare", help="compare two recorded runs; exits with status 1 on regressions")
+    compare.add_argument("base", nargs="?", default="-2", help="index or git revision prefix of the baseline run (default: -2, the one before last)")
+    compare.add_argument("head", nargs="?", default="-1", help="index or git revision prefix of the new run (default: -1, the last)")
+    compare.add_argument("--threshold", type=float, default=0.10, help="relative slowdown or allocation growth reported as a regression (default: 0.10)")
+    compare.add_argument("--history", default=HISTORY_FILE, help=f"JSON history file (default: {HISTORY_FILE})")
+
+    generate = commands.add_parser("generate", help="write a synthetic km,price CSV")
+    generate.add_argument("rows", type=float, help="number of rows, up to 1e8")
+    generate.add_argument("output", help="CSV file to write")
+    add_generator_arguments(generate)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Run the selected subcommand and return its exit code."""
+    args = parse_args(argv)
+    try:
+        if args.command == "generate":
+            write_csv(args.output, int(args.rows), noise=args.noise, offset=args.offset, spread=args.spread, seed=args.seed)
+            print(f"{int(args.rows):,} rows written to {args.output}")
+            return 0
+        if args.command == "run":
+            sizes = [int(size) for size in args.sizes]
+            print(f"Benchmarking {len(args.cases)} cases at {', '.join(f'{size:,}' for size in sizes)} rows ({args.dtype}, best of {args.repeats})")
+            record = run_benchmarks(sizes, args.cases, args.repeats, args.dtype, noise=args.noise, offset=args.offset, spread=args.spread, seed=args.seed)
+            count = append_history(record, args.history)
+            print(f"Run {count} ({record['revision']}) saved to {args.history}")
+            return 0
+
+        history = load_history(args.history)
+        regressions = compare_runs(find_run(history, args.base), find_run(history, args.head), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+        print("No regressions")
+        return 0
+    except ValueError as e:
+        logger.error(str(e))
+        print(f"Error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
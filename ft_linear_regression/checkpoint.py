@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Incremental training checkpoint for append-only CSV files.
+Stores the running sufficient statistics with the byte offset and line number of the first row not yet
+consumed, next to model_params.json, so the next run only parses the rows appended since.
+"""
+
+import hashlib
+import json
+import os
+from stats import SufficientStats
+from utils import write_json_atomic
+from logging_config import get_logger
+
+# Setup logger for checkpoint module
+logger = get_logger(__name__)
+
+CHECKPOINT_VERSION = 1
+FINGERPRINT_BYTES = 4096
+
+
+def checkpoint_path(model_file="model_params.json"):
+    """Checkpoint file stored next to the model file (model_params.json -> model_params.checkpoint.json)."""
+    root, _ = os.path.splitext(model_file)
+    return f"{root}.checkpoint.json"
+
+
+def _fingerprint(data_file, offset):
+    """SHA-256 of the first and the last FINGERPRINT_BYTES before offset (header and last consumed rows)."""
+    digest = hashlib.sha256()
+    with open(data_file, "rb") as f:
+        digest.update(f.read(min(FINGERPRINT_BYTES, offset)))
+        tail = max(offset - FINGERPRINT_BYTES, FINGERPRINT_BYTES)
+        if tail < offset:
+            f.seek(tail)
+            digest.update(f.read(offset - tail))
+    return digest.hexdigest()
+
+
+def load_checkpoint(path, data_file):
+    """Return (stats, offset, line) to resume from, or None when missing, stale or the data was rewritten.
+
+    The data file is assumed append-only: the checkpoint is only reused if the file is at least offset
+    bytes long and its header and last consumed bytes are unchanged.
+    """
+    try:
+        with open(path, "r") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        logger.warning(f"Ignoring unreadable checkpoint '{path}'")
+        return None
+
+    offset = state.get("offset", 0)
+    if state.get("version") != CHECKPOINT_VERSION or state.get("data_file") != os.path.basename(data_file):
+        logger.info(f"Checkpoint '{path}' does not match '{data_file}', retraining from scratch")
+        return None
+    if os.path.getsize(data_file) < offset or _fingerprint(data_file, offset) != state.get("fingerprint"):
+        logger.info(f"'{data_file}' was modified before the checkpoint offset, retraining from scratch")
+        return None
+    return SufficientStats.from_dict(state["stats"]), offset, state["line"]
+
+
+def save_checkpoint(path, data_file, stats, offset, line):
+    """Atomically write the running statistics and the position of the first unconsumed line."""
+    state = {"version": CHECKPOINT_VERSION, "data_file": os.path.basename(data_file), "offset": offset, "line": line, "fingerprint": _fingerprint(data_file, offset), "stats": stats.to_dict()}
+    write_json_atomic(path, state)
+    logger.debug(f"Checkpoint saved to {path} (offset {offset}, {stats.n} samples)")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Duplicate compression of (mileage, price) samples.
+Identical rows are collapsed into one row weighted by its count, so weighted training and metrics
+do work proportional to the number of distinct rows and give the same results as the raw rows.
+"""
+
+import sys
+import time
+import numpy as np
+from logging_config import get_logger
+
+# Setup logger for compression module
+logger = get_logger(__name__)
+
+
+def compress_samples(mileage, price):
+    """Distinct (mileage, price) rows and their counts as float64 weights, sorted by mileage then price.
+
+    Rows are grouped with one np.unique sort of complex keys (mileage + i·price), which orders
+    lexicographically and is several times faster than np.lexsort or np.unique(axis=0).
+    """
+    keys, counts = np.unique(np.asarray(mileage, dtype=np.float64) + 1j * np.asarray(price, dtype=np.float64), return_counts=True)
+    logger.debug(f"Compressed {len(mileage)} rows into {len(keys)} distinct rows")
+    return keys.real.copy(), keys.imag.copy(), counts.astype(np.float64)
+
+
+def compare_compression(n_samples=2_000_000, mileage_step=1000, price_step=100, seed=0):
+    """Print the training time on raw rows against compression plus weighted training, and the parameter difference."""
+    from train import LinearRegression, optimize_hyperparameters
+
+    rng = np.random.default_rng(seed)
+    x = np.round(rng.uniform(0, 300_000, n_samples) / mileage_step) * mileage_step
+    y = np.round((9000 - 0.02 * x + rng.normal(0, 500, n_samples)) / price_step) * price_step
+    print(f"{n_samples:,} samples rounded to {mileage_step} km / {price_step} price units")
+
+    start = time.perf_counter()
+    distinct_x, distinct_y, weights = compress_samples(x, y)
+    compress = time.perf_counter() - start
+    print(f"  {'compress_samples':<28} {compress:8.3f}s  {len(weights):,} distinct rows ({n_samples / len(weights):.0f}x fewer)")
+
+    methods = (
+        ("exact", lambda x, y, w=None: LinearRegression(solver="exact").fit(x, y, verbose=False, sample_weight=w)),
+        ("gd (lr 0.5)", lambda x, y, w=None: LinearRegression(learning_rate=0.5).fit(x, y, verbose=False, sample_weight=w)),
+        ("gd learning rate search", lambda x, y, w=None: optimize_hyperparameters(x, y, sample_weight=w)[1]),
+    )
+    for name, train in methods:
+        start = time.perf_counter()
+        raw = train(x, y)
+        raw_time = time.perf_counter() - start
+        start = time.perf_counter()
+        weighted = train(distinct_x, distinct_y, weights)
+        weighted_time = time.perf_counter() - start + compress
+        difference = max(abs(weighted.theta0_final - raw.theta0_final) / abs(raw.theta0_final), abs(weighted.theta1_final - raw.theta1_final) / abs(raw.theta1_final))
+        print(f"  {name:<28} raw {raw_time:8.3f}s  compressed {weighted_time:8.3f}s  {raw_time / weighted_time:6.1f}x  max rel. parameter difference {difference:.1e}")
+
+
+if __name__ == "__main__":
+    compare_compression(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
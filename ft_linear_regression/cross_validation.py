@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Repeated k-fold cross-validation of the linear model.
+Folds are contiguous blocks of a shuffled row order. For the exact solver, prefix sums of the centered
+moments over that order give every fold's training and held-out sums by subtraction, so all folds are
+fitted and scored in O(1) each after one pass. Gradient descent folds run on a process pool that reads
+the data from one shared-memory block instead of receiving a copy per task.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from metrics import RegressionMetrics
+from training_trace import denormalize
+from logging_config import get_logger
+
+# Setup logger for cross-validation module
+logger = get_logger(__name__)
+
+
+def fold_bounds(n_samples, folds):
+    """Start of every fold in the shuffled order, plus n_samples; fold sizes differ by at most one."""
+    if folds < 2 or folds > n_samples // 2:
+        raise ValueError(f"Cross-validation needs 2 <= folds <= {n_samples // 2} for {n_samples} samples")
+    return np.arange(folds + 1) * n_samples // folds
+
+
+def shuffled_order(n_samples, seed, repeat):
+    """Row order of one repetition; the same (seed, repeat) always gives the same folds."""
+    return np.random.default_rng([seed, repeat]).permutation(n_samples)
+
+
+def _prefix_moments(x, y, order):
+    """(5, n+1) prefix sums of x, y, x², y² and xy over the shuffled order (x and y centered beforehand)."""
+    x, y = x[order], y[order]
+    moments = np.zeros((5, len(x) + 1))
+    # One contiguous cumsum per moment (a cumsum down the columns of an (n, 5) array is strided)
+    for row, values in zip(moments, (x, y, x * x, y * y, x * y)):
+        np.cumsum(values, out=row[1:])
+    return moments
+
+
+def _fit_and_score(train, test):
+    """Least-squares (a, b) on the training sums, and held-out SSE and SS_tot.
+
+    train and test are (count, Σx, Σy, Σx², Σy², Σxy) tuples of arrays with one entry per fold.
+    """
+    (n, sx, sy, sxx, _, sxy), (m, tx, ty, txx, tyy, txy) = train, test
+    mean_x, mean_y = sx / n, sy / n
+    m2_x, c_xy = sxx - sx * mean_x, sxy - sx * mean_y
+    b = np.divide(c_xy, m2_x, out=np.zeros_like(c_xy), where=m2_x > 0)
+    a = mean_y - b * mean_x
+    sse = tyy + m * a * a + b * b * txx - 2 * a * ty - 2 * b * txy + 2 * a * b * tx
+    return a, b, np.maximum(sse, 0.0), tyy - ty * ty / m
+
+
+def cross_validate_exact(x, y, folds=5, repeats=1, seed=0):
+    """Held-out scores of the closed-form fit for every (repeat, fold).
+
+    Returns a dict of (repeats, folds) arrays: mse and r_squared on the held-out fold, and the theta0 and
+    theta1 fitted on the other folds.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    bounds = fold_bounds(len(x), folds)
+    # Centering keeps the moment sums small, so differences of prefix sums lose little precision
+    mean_x, mean_y = x.mean(), y.mean()
+    xc, yc = x - mean_x, y - mean_y
+
+    scores = {name: np.empty((repeats, folds)) for name in ("mse", "r_squared", "theta0", "theta1")}
+    test_n = np.diff(bounds).astype(np.float64)
+    train_n = len(x) - test_n
+    for r in range(repeats):
+        moments = _prefix_moments(xc, yc, shuffled_order(len(x), seed, r))
+        test = np.diff(moments[:, bounds], axis=1)
+        train = moments[:, -1:] - test
+        a, b, sse, ss_total = _fit_and_score((train_n, *train), (test_n, *test))
+        scores["mse"][r] = sse / test_n
+        scores["r_squared"][r] = np.where(ss_total > 0, 1 - sse / np.where(ss_total > 0, ss_total, 1), 0.0)
+        scores["theta1"][r] = b
+        scores["theta0"][r] = mean_y + a - b * mean_x
+    return scores
+
+
+# Data of the pool workers: attached once per process by _attach_shared
+_shared = {}
+
+
+def _attach_shared(name, n_samples):
+    block = shared_memory.SharedMemory(name=name)
+    _shared["block"] = block
+    _shared["data"] = np.ndarray((2, n_samples), dtype=np.float64, buffer=block.buf)
+
+
+def _cross_validate_fold(learning_rates, n_iterations, folds, seed, repeat, fold):
+    """Train every learning rate on all folds but one of a repetition and score it on the held-out fold.
+
+    Returns (mse, r_squared) arrays over the learning rates; NaN where training diverged.
+    """
+    from train import BatchedLinearRegression
+
+    x, y = _shared["data"]
+    order = shuffled_order(x.shape[0], seed, repeat)
+    bounds = fold_bounds(x.shape[0], folds)
+    test_rows = order[bounds[fold] : bounds[fold + 1]]
+    train_rows = np.concatenate((order[: bounds[fold]], order[bounds[fold + 1] :]))
+
+    batch = BatchedLinearRegression(learning_rates, n_iterations=n_iterations, sampling=lambda i: False).fit(x[train_rows], y[train_rows])
+    theta0, theta1 = denormalize(batch.theta0, batch.theta1, *batch._scale())
+    test_x, test_y = x[test_rows], y[test_rows]
+
+    mse, r_squared = np.full(len(learning_rates), np.nan), np.full(len(learning_rates), np.nan)
+    for j in np.flatnonzero(~batch.diverged):
+        try:
+            metrics = RegressionMetrics().update(test_x, test_y, theta0[j], theta1[j]).result()
+        except ValueError:
+            continue
+        mse[j], r_squared[j] = metrics["mse"], metrics["r_squared"]
+    return mse, r_squared
+
+
+def cross_validate_gd(x, y, learning_rates, folds=5, repeats=1, seed=0, n_iterations=1000, workers=None):
+    """Held-out scores of gradient descent for every (learning rate, repeat, fold).
+
+    Each (repeat, fold) is one task on a pool of `workers` processes (default: all cores); every task
+    trains all learning rates together with BatchedLinearRegression. Folds are the same as in
+    cross_validate_exact for the same seed. Returns a dict of (learning rates, repeats, folds) arrays
+    of mse and r_squared, NaN where training diverged.
+    """
+    learning_rates = np.asarray(learning_rates, dtype=np.float64)
+    n_samples = len(x)
+    fold_bounds(n_samples, folds)
+    tasks = [(r, f) for r in range(repeats) for f in range(folds)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+
+    block = shared_memory.SharedMemory(create=True, size=max(2 * n_samples * 8, 1))
+    data = np.ndarray((2, n_samples), dtype=np.float64, buffer=block.buf)
+    try:
+        data[0], data[1] = x, y
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared, initargs=(block.name, n_samples)) as pool:
+            futures = [pool.submit(_cross_validate_fold, learning_rates, n_iterations, folds, seed, r, f) for r, f in tasks]
+            results = [future.result() for future in futures]
+    finally:
+        # The view must be released before the block can be closed
+        del data
+        block.close()
+        block.unlink()
+
+    mse = np.array([result[0] for result in results]).T.reshape(len(learning_rates), repeats, folds)
+    r_squared = np.array([result[1] for result in results]).T.reshape(len(learning_rates), repeats, folds)
+    logger.debug(f"Cross-validated {len(learning_rates)} learning rates on {len(tasks)} folds with {workers} processes")
+    return {"mse": mse, "r_squared": r_squared}
+
+
+def select_learning_rate(x, y, learning_rates=None, folds=5, repeats=1, seed=0, n_iterations=1000, workers=None):
+    """Learning rate with the lowest mean held-out MSE (None if every candidate diverged on at least one fold)."""
+    if learning_rates is None:
+        from train import DEFAULT_LEARNING_RATES as learning_rates
+
+    scores = cross_validate_gd(x, y, learning_rates, folds, repeats, seed, n_iterations, workers)
+    mean_mse = scores["mse"].reshape(len(learning_rates), -1).mean(axis=1)
+    if np.all(np.isnan(mean_mse)):
+        return None
+    best = int(np.nanargmin(mean_mse))
+    logger.info(f"Cross-validated learning rate: {learning_rates[best]:.4g} (held-out MSE {mean_mse[best]:.2f}, {folds} folds x {repeats} repeats)")
+    return float(learning_rates[best])
+
+
+def compare_cross_validation(n_samples=200_000, folds=20, repeats=3, learning_rates=(0.01, 0.1, 0.5, 1.0), workers=os.cpu_count()):
+    """Print the time of refitting every fold against prefix sums (exact), and of gradient descent folds on 1 and `workers` processes."""
+    from train import LinearRegression
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 300_000, n_samples)
+    y = 9000 - 0.02 * x + rng.normal(0, 500, n_samples)
+    print(f"{n_samples:,} samples, {folds} folds x {repeats} repeats")
+
+    start = time.perf_counter()
+    reference = np.empty((repeats, folds))
+    bounds = fold_bounds(n_samples, folds)
+    for r in range(repeats):
+        order = shuffled_order(n_samples, 0, r)
+        for f in range(folds):
+            test, train = order[bounds[f] : bounds[f + 1]], np.concatenate((order[: bounds[f]], order[bounds[f + 1] :]))
+            model = LinearRegression(solver="exact").fit(x[train], y[train], verbose=False)
+            reference[r, f] = RegressionMetrics().update(x[test], y[test], model.theta0_final, model.theta1_final).result()["mse"]
+    refit = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = cross_validate_exact(x, y, folds, repeats)
+    elapsed = time.perf_counter() - start
+    error = np.max(np.abs(scores["mse"] - reference) / reference)
+    print(f"  {'exact, refit per fold':<28} {refit:8.3f}s")
+    print(f"  {'exact, prefix sums':<28} {elapsed:8.3f}s  {refit / elapsed:6.1f}x  max rel. MSE difference {error:.1e}")
+
+    baseline = None
+    for count in sorted({1, workers}):
+        start = time.perf_counter()
+        cross_validate_gd(x, y, learning_rates, folds, repeats, workers=count)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"  {f'gd, {len(learning_rates)} rates, {count} processes':<28} {elapsed:8.3f}s  {baseline / elapsed:6.1f}x")
+
+
+if __name__ == "__main__":
+    compare_cross_validation(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Fast chunked CSV ingestion for numeric columns.
+Reads the file in large byte blocks, parses each block in bulk with NumPy and reports
+malformed rows by line number instead of aborting the whole load.
+"""
+
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from logging_config import get_logger
+
+# Setup logger for CSV reader module
+logger = get_logger(__name__)
+
+DEFAULT_BLOCK_BYTES = 32 << 20
+PARSE_BLOCK_BYTES = 256 << 10
+MIN_SPLIT_LINES = 64
+MAX_REPORTED_ERRORS = 10
+MAX_DIGITS = 15
+MAX_TOKEN_BYTES = 22
+
+_POW10 = 10.0 ** np.arange(MAX_TOKEN_BYTES + 1)
+_DIGIT_WEIGHT = np.zeros(256)
+_DIGIT_WEIGHT[48:58] = np.arange(10)
+_DIGIT_SCALE = np.ones(256)
+_DIGIT_SCALE[48:58] = 10.0
+
+
+def iter_line_blocks(path, block_bytes=DEFAULT_BLOCK_BYTES, skip_header=True, start=0, stop=None, first_line=1):
+    """Yield (first_line_number, block) where every block holds whole lines; line numbers are 1-based.
+
+    start/stop restrict reading to a byte range; first_line is the number of the line at start.
+    The header is only skipped when reading from the beginning of the file.
+    """
+    with open(path, "rb") as f:
+        line_number = first_line
+        f.seek(start)
+        if skip_header and start == 0:
+            f.readline()
+            line_number += 1
+        remaining = float("inf") if stop is None else stop - f.tell()
+        remainder = b""
+        while True:
+            data = f.read(int(min(block_bytes, max(remaining, 0))))
+            remaining -= len(data)
+            block = remainder + data
+            if data:
+                cut = block.rfind(b"\n") + 1
+                block, remainder = block[:cut], block[cut:]
+            if block:
+                yield line_number, block
+                line_number += block.count(b"\n")
+            if not data:
+                break
+
+
+def _split_block(block, first_line, piece_bytes):
+    """Split a block of whole lines into (first_line_number, piece) parts of about piece_bytes."""
+    start = 0
+    while start < len(block):
+        end = block.find(b"\n", start + piece_bytes) + 1 or len(block)
+        yield first_line, block[start:end]
+        first_line += block.count(b"\n", start, end)
+        start = end
+
+
+def _parse_decimal_block(block, n_columns):
+    """Vectorized parse of plain decimals ([-]digits[.digits], at most 15 digits) straight from the bytes.
+
+    Returns None when the block holds anything else (exponents, blank or ragged lines, text) so a more
+    general parser can take over. Each value is an exact integer mantissa divided by a power of ten,
+    which rounds exactly like strtod. The work is NumPy ufuncs and gathers, which release the GIL, so
+    blocks parse in parallel on a thread pool.
+    """
+    if not block.endswith(b"\n"):
+        block += b"\n"
+    raw = np.frombuffer(block, dtype=np.uint8)
+    is_sep = (raw == 44) | (raw == 10)
+    sep_pos = np.flatnonzero(is_sep)
+    n_tokens = len(sep_pos)
+    is_minus, is_dot = raw == 45, raw == 46
+    n_known = n_tokens + np.count_nonzero(raw - np.uint8(48) < 10) + np.count_nonzero(is_minus) + np.count_nonzero(is_dot)
+    if n_tokens == 0 or n_tokens % n_columns or n_known != len(raw):
+        return None
+
+    # Lines must hold exactly n_columns fields: newlines sit at every n_columns-th separator and nowhere else
+    newline_pos = sep_pos[n_columns - 1 :: n_columns]
+    if block.count(b"\n") != len(newline_pos) or not np.all(raw[newline_pos] == 10):
+        return None
+
+    starts = np.empty_like(sep_pos)
+    starts[0] = 0
+    starts[1:] = sep_pos[:-1] + 1
+    lengths = sep_pos - starts
+    width = int(lengths.max())
+    if lengths.min() == 0 or width > MAX_TOKEN_BYTES:
+        return None
+
+    negative = raw[starts] == 45
+    if np.count_nonzero(is_minus) != np.count_nonzero(negative):
+        return None
+    dot_pos = np.flatnonzero(is_dot)
+    dot_token = np.searchsorted(sep_pos, dot_pos)
+    if np.any(np.diff(dot_token) == 0):
+        return None
+    frac_digits = np.zeros(n_tokens, dtype=np.int64)
+    frac_digits[dot_token] = sep_pos[dot_token] - dot_pos - 1
+    n_digits = lengths - negative
+    n_digits[dot_token] -= 1
+    if n_digits.min() == 0 or n_digits.max() > MAX_DIGITS:
+        return None
+
+    # Horner scheme over character positions: mantissa = mantissa * 10 + digit for every digit byte;
+    # '-', '.' and bytes past the token end multiply by 1 and add 0
+    mantissa = np.zeros(n_tokens)
+    for j in range(width):
+        column = np.take(raw, starts + j, mode="clip")
+        if j >= lengths.min():
+            column = np.where(lengths > j, column, 0)
+        mantissa *= _DIGIT_SCALE[column]
+        mantissa += _DIGIT_WEIGHT[column]
+
+    values = mantissa / _POW10[frac_digits]
+    values[negative] *= -1
+    return values.reshape(-1, n_columns)
+
+
+def _loadtxt_block(block, n_columns):
+    """General C parser fallback for a block (exponents, blank lines); None if any row is malformed."""
+    try:
+        values = np.loadtxt(io.BytesIO(block), delimiter=",", ndmin=2)
+    except ValueError:
+        return None
+    return values if values.shape[1] == n_columns or len(values) == 0 else None
+
+
+def _slow_parse(block, usecols, first_line):
+    """Parse line by line, collecting (line_number, reason) for malformed rows; blank lines are skipped."""
+    rows, errors = [], []
+    for offset, line in enumerate(block.split(b"\n")):
+        if not line.strip():
+            continue
+        fields = line.split(b",")
+        try:
+            rows.append([float(fields[c]) for c in usecols])
+        except (IndexError, ValueError):
+            errors.append((first_line + offset, line.decode("utf-8", "replace").strip()))
+    return np.array(rows, dtype=np.float64).reshape(-1, len(usecols)), errors
+
+
+def parse_block(block, first_line, n_columns, usecols=(0, 1)):
+    """Parse a block of whole lines into a (rows, len(usecols)) array plus a list of malformed rows.
+
+    Tries the vectorized decimal parser, then np.loadtxt; blocks that still fail are bisected so only
+    small sub-blocks around bad lines are parsed line by line.
+    """
+    values = _parse_decimal_block(block, n_columns)
+    if values is None:
+        values = _loadtxt_block(block, n_columns)
+    if values is not None:
+        if tuple(usecols) != tuple(range(n_columns)):
+            values = values[:, list(usecols)].reshape(-1, len(usecols))
+        return values, []
+
+    middle = block.find(b"\n", len(block) // 2) + 1
+    if block.count(b"\n") < MIN_SPLIT_LINES or middle in (0, len(block)):
+        return _slow_parse(block, usecols, first_line)
+
+    head_values, head_errors = parse_block(block[:middle], first_line, n_columns, usecols)
+    tail_values, tail_errors = parse_block(block[middle:], first_line + block.count(b"\n", 0, middle), n_columns, usecols)
+    return np.concatenate([head_values, tail_values]), head_errors + tail_errors
+
+
+def _iter_parsed_pieces(path, usecols, block_bytes, workers, start=0, stop=None, first_line=1):
+    """Yield (values, errors) for every ~256 KB piece of the file (or byte range), in order, one piece per pool worker."""
+    n_columns = count_columns(path)
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    parse = lambda piece: parse_block(piece[1], piece[0], n_columns, usecols)
+    try:
+        for block_line, block in iter_line_blocks(path, block_bytes, start=start, stop=stop, first_line=first_line):
+            pieces = _split_block(block, block_line, PARSE_BLOCK_BYTES)
+            yield list(pool.map(parse, pieces) if pool else map(parse, pieces))
+    finally:
+        if pool:
+            pool.shutdown()
+
+
+def count_columns(path):
+    """Number of comma-separated columns in the header line."""
+    with open(path, "rb") as f:
+        return f.readline().count(b",") + 1
+
+
+def column_index(path, column):
+    """Index of a column given by header name or by (0-based) index."""
+    with open(path, "rb") as f:
+        names = [name.strip() for name in f.readline().decode("utf-8", "replace").split(",")]
+    if isinstance(column, int) or str(column).isdigit():
+        index = int(column)
+        if index >= len(names):
+            raise ValueError(f"Column {index} out of range ({len(names)} columns in '{path}')")
+        return index
+    if column not in names:
+        raise ValueError(f"No column '{column}' in '{path}' (columns: {', '.join(names)})")
+    return names.index(column)
+
+
+def iter_csv_blocks(path, usecols=(0, 1), block_bytes=DEFAULT_BLOCK_BYTES, workers=1, start=0, stop=None, first_line=1):
+    """Yield (values, errors) per byte block read from the file (header skipped).
+
+    Each block is parsed as ~256 KB pieces, spread over a thread pool when workers > 1.
+    start/stop/first_line select a byte range of whole lines, as in iter_line_blocks.
+    """
+    for results in _iter_parsed_pieces(path, usecols, block_bytes, workers, start, stop, first_line):
+        if len(results) == 1:
+            yield results[0]
+        else:
+            yield np.concatenate([values for values, _ in results]), [error for _, errors in results for error in errors]
+
+
+def report_errors(path, errors):
+    """Log malformed rows (line number and content), truncated to the first few."""
+    if not errors:
+        return
+    logger.warning(f"Skipped {len(errors)} malformed rows in '{path}'")
+    for line_number, text in errors[:MAX_REPORTED_ERRORS]:
+        logger.warning(f"  line {line_number}: {text[:80]!r}")
+
+
+def count_lines(path, block_bytes=DEFAULT_BLOCK_BYTES, start=0, stop=None):
+    """Count newline-terminated lines (plus a trailing unterminated one) in a byte range with block reads."""
+    count, last = 0, b"\n"
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = float("inf") if stop is None else stop - start
+        while remaining > 0 and (block := f.read(int(min(block_bytes, remaining)))):
+            remaining -= len(block)
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count + (last != b"\n")
+
+
+def whole_lines_end(path, block_bytes=1 << 16):
+    """Byte offset just past the last newline, so a line that is still being appended is left out."""
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - block_bytes, 0)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b"\n")
+            if cut >= 0:
+                return start + cut + 1
+            end = start
+    return 0
+
+
+def read_csv_columns(path, usecols=(0, 1), block_bytes=DEFAULT_BLOCK_BYTES, workers=1, start=0, stop=None, first_line=1):
+    """Read numeric columns into a preallocated (len(usecols), n) array; returns (data, errors).
+
+    The array is sized from a fast newline count and filled block by block, then trimmed to the rows
+    that parsed. Malformed rows are skipped and reported with their line numbers. start/stop/first_line
+    read a byte range of whole lines only, as in iter_line_blocks.
+    """
+    data = np.empty((len(usecols), max(count_lines(path, start=start, stop=stop) - (start == 0), 0)))
+    rows, errors = 0, []
+    for results in _iter_parsed_pieces(path, usecols, block_bytes, workers, start, stop, first_line):
+        for values, piece_errors in results:
+            data[:, rows : rows + len(values)] = values.T
+            rows += len(values)
+            errors.extend(piece_errors)
+    report_errors(path, errors)
+    return data[:, :rows], errors
+
+
+def compare_throughput(path, workers=os.cpu_count()):
+    """Print MB/s of np.loadtxt against the block parser with one and several worker threads."""
+    size_mb = os.path.getsize(path) / 1e6
+    candidates = [
+        ("np.loadtxt", lambda: np.loadtxt(path, delimiter=",", skiprows=1, usecols=(0, 1))),
+        ("block parser (1 thread)", lambda: read_csv_columns(path)),
+        (f"block parser ({workers} threads)", lambda: read_csv_columns(path, workers=workers)),
+    ]
+    print(f"{path}: {size_mb:.1f} MB")
+    for name, load in candidates:
+        start = time.perf_counter()
+        load()
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<28} {elapsed:8.3f}s  {size_mb / elapsed:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python csv_reader.py FILE.csv [WORKERS]")
+        exit(1)
+    compare_throughput(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
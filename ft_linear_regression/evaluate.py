@@ -4,44 +4,56 @@ Model evaluation script for linear regression.
 Calculates performance metrics (MSE, R²) on training data with visual display.
 """
 
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
-from utils import estimate_price, load_model_params, load_data
+from plotting import MAX_SCATTER_POINTS, StreamingHistogram, add_plot_arguments, get_pyplot, render, scatter, stratified_sample
+from bootstrap import DEFAULT_LEVEL, Bootstrap
+from cross_validation import cross_validate_exact
+from metrics import RegressionMetrics, evaluate_stream
+from utils import DTYPES, estimate_price, iter_data_chunks, load_model_params, load_data
 from logging_config import get_logger
 
 # Setup logger for evaluation module
 logger = get_logger(__name__)
 
 
-def calculate_metrics(mileage, price, theta0, theta1):
-    """Calculate all evaluation metrics for the model."""
-    logger.debug(f"Calculating metrics for {len(mileage)} data points")
+def calculate_metrics(mileage, price, theta0, theta1, keep_arrays=True, weights=None):
+    """Calculate all evaluation metrics for the model in one fused pass (see metrics.RegressionMetrics).
 
-    predictions = np.array([estimate_price(x, theta0, theta1) for x in mileage])
-    errors = price - predictions
-    abs_errors = np.abs(errors)
+    keep_arrays also returns the predictions and errors drawn by the dashboard. weights are duplicate
+    counts of compressed rows (see compression.py).
+    """
+    logger.debug(f"Calculating metrics for {len(mileage)} data points")
 
-    mse = np.mean(errors**2)
-    rmse = np.sqrt(mse)
-    mae = np.mean(abs_errors)
+    metrics = RegressionMetrics().update(mileage, price, theta0, theta1, weights).result()
+    if keep_arrays:
+        metrics["predictions"] = theta0 + theta1 * np.asarray(mileage, dtype=np.float64)
+        metrics["errors"] = price - metrics["predictions"]
 
-    ss_total = np.sum((price - np.mean(price)) ** 2)
-    ss_residual = np.sum(errors**2)
-    r_squared = 1 - (ss_residual / ss_total) if ss_total != 0 else 0
+    logger.debug(f"Metrics calculated: R²={metrics['r_squared']:.4f}, RMSE={metrics['rmse']:.2f}, MAE={metrics['mae']:.2f}, MAPE={metrics['mape']:.2f}%")
+    return metrics
 
-    max_error = np.max(abs_errors)
-    min_error = np.min(abs_errors)
-    mean_price = np.mean(price)
-    mape = np.mean(np.abs(errors / price)) * 100
 
-    logger.debug(f"Metrics calculated: R²={r_squared:.4f}, RMSE={rmse:.2f}, MAE={mae:.2f}, MAPE={mape:.2f}%")
+def model_quality(r_squared):
+    """Quality label and display color for a coefficient of determination."""
+    if r_squared > 0.9:
+        return "Excellent", "green"
+    if r_squared > 0.7:
+        return "Good", "orange"
+    if r_squared > 0.5:
+        return "Fair", "red"
+    return "Poor", "darkred"
 
-    return {"predictions": predictions, "errors": errors, "abs_errors": abs_errors, "mse": mse, "rmse": rmse, "mae": mae, "r_squared": r_squared, "max_error": max_error, "min_error": min_error, "mean_price": mean_price, "mape": mape}
 
+def create_visualizations(mileage, price, metrics, theta0, theta1, all_points=False, weights=None):
+    """Create comprehensive visualization dashboard.
 
-def create_visualizations(mileage, price, metrics, theta0, theta1):
-    """Create comprehensive visualization dashboard."""
+    Above MAX_SCATTER_POINTS samples, predictions are drawn as a density map, residuals as a stratified
+    sample and errors as a pre-binned histogram; all_points draws every sample instead. weights are
+    duplicate counts of compressed rows, so the density map, residual sample and histogram match the raw rows.
+    """
     logger.debug("Creating evaluation visualizations")
+    plt = get_pyplot()
 
     predictions = metrics["predictions"]
     errors = metrics["errors"]
@@ -53,11 +65,12 @@ def create_visualizations(mileage, price, metrics, theta0, theta1):
     min_error = metrics["min_error"]
     mean_price = metrics["mean_price"]
     mape = metrics["mape"]
+    large = (len(errors) if weights is None else weights.sum()) > MAX_SCATTER_POINTS
 
     plt.figure(figsize=(16, 12))
 
     plt.subplot(2, 3, 1)
-    plt.scatter(price, predictions, alpha=0.7, color="blue", s=50)
+    scatter(price, predictions, all_points, weights=weights, alpha=0.7, color="blue", s=50)
     min_val = min(np.min(price), np.min(predictions))
     max_val = max(np.max(price), np.max(predictions))
     plt.plot([min_val, max_val], [min_val, max_val], "r--", linewidth=2, label="Perfect prediction")
@@ -68,15 +81,16 @@ def create_visualizations(mileage, price, metrics, theta0, theta1):
     plt.grid(True, alpha=0.3)
 
     plt.subplot(2, 3, 2)
-    plt.scatter(predictions, errors, alpha=0.7, color="green", s=50)
+    shown = slice(None) if all_points else stratified_sample(predictions, weights=weights)
+    plt.scatter(predictions[shown], errors[shown], alpha=0.7, color="green", s=4 if large else 50)
     plt.axhline(y=0, color="r", linestyle="--", linewidth=2)
     plt.xlabel("Predicted Price")
     plt.ylabel("Residuals (Actual - Predicted)")
-    plt.title("Residuals Analysis")
+    plt.title("Residuals Analysis" if all_points or not large else f"Residuals Analysis (stratified sample of {MAX_SCATTER_POINTS:,})")
     plt.grid(True, alpha=0.3)
 
     plt.subplot(2, 3, 3)
-    plt.hist(errors, bins=10, alpha=0.7, color="orange", edgecolor="black")
+    StreamingHistogram.from_array(errors, bins=50 if large else 10, weights=weights).plot(alpha=0.7, color="orange", edgecolor="black")
     plt.axvline(x=0, color="r", linestyle="--", linewidth=2, label="Perfect prediction")
     plt.xlabel("Prediction Errors")
     plt.ylabel("Frequency")
@@ -100,23 +114,12 @@ def create_visualizations(mileage, price, metrics, theta0, theta1):
         plt.text(bar.get_x() + bar.get_width() / 2.0, height + height * 0.02, f"{value:.2f}", ha="center", va="bottom", fontweight="bold")
 
     plt.subplot(2, 3, 5)
-    if r_squared > 0.9:
-        quality = "Excellent"
-        quality_color = "green"
-    elif r_squared > 0.7:
-        quality = "Good"
-        quality_color = "orange"
-    elif r_squared > 0.5:
-        quality = "Fair"
-        quality_color = "red"
-    else:
-        quality = "Poor"
-        quality_color = "darkred"
+    quality, quality_color = model_quality(r_squared)
 
     plt.pie([r_squared, 1 - r_squared], labels=["Explained Variance", "Unexplained"], colors=[quality_color, "lightgray"], startangle=90, counterclock=False)
     plt.title(f"Model Quality: {quality}\nR² = {r_squared:.3f}")
 
-    _create_metrics_table(mileage, mse, rmse, mae, r_squared, mape, max_error, min_error)
+    _create_metrics_table(metrics["n_samples"], mse, rmse, mae, r_squared, mape, max_error, min_error)
 
     plt.suptitle(f"Linear Regression Model Evaluation\nFormula: price = {theta0:.2f} + ({theta1:.6f} × mileage)", fontsize=12, fontweight="bold")
     plt.tight_layout()
@@ -126,9 +129,9 @@ def create_visualizations(mileage, price, metrics, theta0, theta1):
     return quality
 
 
-def _create_metrics_table(mileage, mse, rmse, mae, r_squared, mape, max_error, min_error):
+def _create_metrics_table(n_samples, mse, rmse, mae, r_squared, mape, max_error, min_error):
     """Helper function to create the metrics table."""
-    ax6 = plt.subplot(2, 3, 6)
+    ax6 = get_pyplot().subplot(2, 3, 6)
     ax6.axis("tight")
     ax6.axis("off")
 
@@ -144,7 +147,7 @@ def _create_metrics_table(mileage, mse, rmse, mae, r_squared, mape, max_error, m
         ["MAPE", f"{mape:.2f}%", f"{'Excellent' if mape < 10 else 'Good' if mape < 15 else 'Fair'} accuracy"],
         ["Max Error", f"{max_error:.2f}", f"Worst prediction off by {max_error:.0f}"],
         ["Min Error", f"{min_error:.2f}", f"Best prediction off by {min_error:.0f}"],
-        ["Data Points", f"{len(mileage)}", "Training samples used"],
+        ["Data Points", f"{n_samples:.0f}", "Training samples used"],
     ]
 
     table = ax6.table(cellText=metrics_data[1:], colLabels=metrics_data[0], cellLoc="center", loc="lower center", colWidths=[0.25, 0.25, 0.5])
@@ -162,22 +165,32 @@ def _create_metrics_table(mileage, mse, rmse, mae, r_squared, mape, max_error, m
                 cell.set_facecolor("#f0f0f0" if i % 2 == 0 else "white")
 
 
-def print_evaluation_summary(quality, metrics, theta0, theta1):
-    """Print detailed evaluation summary with examples."""
+def print_evaluation_summary(quality, metrics, theta0, theta1, bootstrap=None, level=DEFAULT_LEVEL):
+    """Print detailed evaluation summary with examples.
+
+    With a fitted Bootstrap, R², RMSE, MAE and the example prices also get percentile intervals at level.
+    """
     r_squared = metrics["r_squared"]
     mae = metrics["mae"]
     mape = metrics["mape"]
+    intervals = bootstrap.metric_intervals(level) if bootstrap is not None else None
+
+    def band(name, digits):
+        return f" [{level:.0%}: {intervals[name][0]:.{digits}f} – {intervals[name][1]:.{digits}f}]" if intervals else ""
 
     print("Model evaluation summary:")
-    print(f"* Model accuracy: {quality} (R² = {r_squared:.3f})")
-    print(f"* Average error: ±{mae:.0f} price units")
+    print(f"* Model accuracy: {quality} (R² = {r_squared:.3f}{band('r_squared', 3)})")
+    print(f"* Average error: ±{mae:.0f} price units{band('mae', 0)}")
+    if intervals:
+        print(f"* RMSE: {metrics['rmse']:.0f} price units{band('rmse', 0)}")
     print(f"* Relative error: {mape:.1f}% on average")
 
     example_km = [50000, 100000, 150000, 200000]
-    print("\nPredictions example:")
-    for km in example_km:
+    low, high = bootstrap.price_intervals(example_km, level) if bootstrap is not None else (None, None)
+    print("\nPredictions example:" if bootstrap is None else f"\nPredictions example ({level:.0%} bootstrap prediction interval):")
+    for i, km in enumerate(example_km):
         pred = estimate_price(km, theta0, theta1)
-        print(f"   • {km:,} km → {pred:.0f} price units")
+        print(f"   • {km:,} km → {pred:.0f} price units" + (f" [{low[i]:.0f} – {high[i]:.0f}]" if bootstrap is not None else ""))
 
     print(f"\nFormula: price = {theta0:.0f} + ({theta1:.6f} × mileage)")
 
@@ -189,8 +202,26 @@ def print_evaluation_summary(quality, metrics, theta0, theta1):
         print("* This model needs improvement (more data, additional variables)")
 
 
-def evaluate_model(data_file="data.csv"):
-    """Evaluate model accuracy on training data and display comprehensive visual metrics."""
+def print_cross_validation(mileage, price, folds, repeats=1):
+    """Print held-out RMSE and R² of the least-squares fit over repeated k-fold splits (mean ± std over folds)."""
+    scores = cross_validate_exact(mileage, price, folds, repeats)
+    rmse, r_squared = np.sqrt(scores["mse"]), scores["r_squared"]
+    print(f"\nCross-validation ({folds} folds x {repeats} repeats, held-out data):")
+    print(f"* RMSE: {rmse.mean():.0f} ± {rmse.std():.0f} price units")
+    print(f"* R²: {r_squared.mean():.3f} ± {r_squared.std():.3f}")
+
+
+def evaluate_model(data_file="data.csv", plot=True, save_plot=None, plot_background=False, plot_all_points=False, stream=False, chunk_size=1_000_000, cv_folds=None, cv_repeats=1, bootstrap_replicates=None, level=DEFAULT_LEVEL, compress=False, dtype="float64"):
+    """Evaluate model accuracy on training data and display comprehensive visual metrics.
+
+    plot=False prints the summary only; save_plot writes the dashboard to a file instead of opening a window.
+    stream=True computes the metrics chunk by chunk without loading the file; the plots then show the first chunk.
+    cv_folds also reports held-out metrics of the least-squares fit over cv_repeats shuffled k-fold splits.
+    bootstrap_replicates adds bootstrap intervals at level to the metrics and example predictions.
+    compress computes the metrics on duplicate-collapsed weighted rows (same values); the dashboard then
+    draws the distinct rows weighted by their counts, and cross-validation and bootstrap run on the rows expanded again.
+    dtype="float32" loads and evaluates the data in float32 with float64 metric sums (in-memory only).
+    """
     logger.debug("Starting model evaluation")
 
     params = load_model_params()
@@ -206,23 +237,38 @@ def evaluate_model(data_file="data.csv"):
     theta1 = params["theta1"]
     logger.debug(f"Model parameters loaded: θ₀={theta0:.6f}, θ₁={theta1:.6f}")
 
-    mileage, price = load_data(data_file)
+    if stream:
+        if cv_folds or bootstrap_replicates:
+            logger.info("Cross-validation and bootstrap intervals are skipped in streaming mode")
+        return _evaluate_stream(data_file, theta0, theta1, plot, save_plot, plot_background, plot_all_points, chunk_size)
+
+    weights = None
+    if compress:
+        mileage, price, weights = load_data(data_file, compress=True, dtype=dtype)
+    else:
+        mileage, price = load_data(data_file, dtype=dtype)
     if mileage is None or price is None:
         logger.error(f"Failed to load data from {data_file}")
         return 1
 
     logger.debug(f"Data loaded successfully: {len(mileage)} data points")
-    logger.info(f"Evaluating on {len(mileage)} data points...")
+    logger.info(f"Evaluating on {len(mileage) if weights is None else int(weights.sum())} data points...")
 
     try:
-        metrics = calculate_metrics(mileage, price, theta0, theta1)
-
-        quality = create_visualizations(mileage, price, metrics, theta0, theta1)
+        metrics = calculate_metrics(mileage, price, theta0, theta1, keep_arrays=plot, weights=weights)
 
-        plt.show()
+        quality, _ = model_quality(metrics["r_squared"])
+        if plot:
+            render(create_visualizations, mileage, price, metrics, theta0, theta1, plot_all_points, weights, save_path=save_plot, background=plot_background)
 
-        print_evaluation_summary(quality, metrics, theta0, theta1)
-        logger.info("Evaluation completed! Visual analysis displayed.")
+        if weights is not None and (bootstrap_replicates or cv_folds):
+            counts = weights.astype(np.int64)
+            mileage, price = np.repeat(mileage, counts), np.repeat(price, counts)
+        bootstrap = Bootstrap(bootstrap_replicates).fit(mileage, price, theta0, theta1) if bootstrap_replicates else None
+        print_evaluation_summary(quality, metrics, theta0, theta1, bootstrap, level)
+        if cv_folds:
+            print_cross_validation(mileage, price, cv_folds, cv_repeats)
+        logger.info("Evaluation completed! Visual analysis displayed." if plot else "Evaluation completed!")
 
         logger.debug("Model evaluation completed successfully")
         return 0
@@ -232,10 +278,50 @@ def evaluate_model(data_file="data.csv"):
         return 1
 
 
-def main():
+def _evaluate_stream(data_file, theta0, theta1, plot, save_plot, plot_background, plot_all_points, chunk_size):
+    """evaluate_model over a CSV read chunk by chunk; the dashboard draws the first chunk with the full-file metrics."""
+    logger.info(f"Evaluating {data_file} in chunks of {chunk_size} rows...")
+    try:
+        metrics = evaluate_stream(data_file, theta0, theta1, chunk_size)
+        quality, _ = model_quality(metrics["r_squared"])
+        if plot:
+            mileage, price = next(iter(iter_data_chunks(data_file, chunk_size)))
+            sample = calculate_metrics(mileage, price, theta0, theta1)
+            metrics.update(predictions=sample["predictions"], errors=sample["errors"])
+            render(create_visualizations, mileage, price, metrics, theta0, theta1, plot_all_points, save_path=save_plot, background=plot_background)
+
+        print_evaluation_summary(quality, metrics, theta0, theta1)
+        logger.info(f"Evaluation completed on {metrics['n_samples']} data points!")
+        return 0
+    except FileNotFoundError:
+        logger.error(f"Data file '{data_file}' not found")
+        return 1
+    except ValueError as e:
+        logger.error(f"Error during evaluation: {e}")
+        print("Error: Evaluation failed")
+        return 1
+
+
+def parse_args(argv=None):
+    """Parse command line options for evaluation."""
+    parser = argparse.ArgumentParser(description="Evaluate the trained linear regression model.")
+    parser.add_argument("--stream", action="store_true", help="compute the metrics chunk by chunk instead of loading the CSV into memory")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows per chunk in streaming mode (default: 1000000)")
+    parser.add_argument("--cv", type=int, metavar="K", help="also report K-fold cross-validated (held-out) RMSE and R²")
+    parser.add_argument("--bootstrap", type=int, metavar="N", help="add bootstrap intervals from N resamples to the metrics and example predictions")
+    parser.add_argument("--level", type=float, default=DEFAULT_LEVEL, help=f"confidence level of the bootstrap intervals (default: {DEFAULT_LEVEL})")
+    parser.add_argument("--compress", action="store_true", help="collapse duplicate rows into weighted samples before computing the metrics")
+    parser.add_argument("--dtype", choices=DTYPES, default="float64", help="dtype of the loaded data; float32 halves memory, metric sums stay float64 (default: float64)")
+    parser.add_argument("--cv-repeats", type=int, default=1, help="reshuffled repetitions of the K-fold split (default: 1)")
+    add_plot_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main function to evaluate the model and handle errors."""
+    args = parse_args(argv)
     try:
-        result = evaluate_model("data.csv")
+        result = evaluate_model("data.csv", plot=not args.no_plot, save_plot=args.save_plot, plot_background=args.plot_background, plot_all_points=args.plot_all_points, stream=args.stream, chunk_size=args.chunk_size, cv_folds=args.cv, cv_repeats=args.cv_repeats, bootstrap_replicates=args.bootstrap, level=args.level, compress=args.compress, dtype=args.dtype)
         if result == 0:
             logger.info("Model evaluation completed successfully!")
         else:
@@ -30,12 +30,13 @@ class ColoredFormatter(logging.Formatter):
         return super().format(record)
 
 
-def configure_logging(level: str = "INFO"):
+def configure_logging(level: str = "INFO", stream=None):
     """
     Configure logging for the entire project.
 
     Args:
         level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+        stream: Output stream for log records (defaults to stdout)
     """
     root_logger = logging.getLogger()
     root_logger.handlers.clear()
@@ -43,7 +44,7 @@ def configure_logging(level: str = "INFO"):
     numeric_level = getattr(logging, level.upper(), logging.INFO)
     root_logger.setLevel(numeric_level)
 
-    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler = logging.StreamHandler(stream or sys.stdout)
     console_formatter = ColoredFormatter(fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s", datefmt="%H:%M:%S")
     console_handler.setFormatter(console_formatter)
     console_handler.setLevel(numeric_level)
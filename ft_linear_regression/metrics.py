@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Fused evaluation metrics for the linear model.
+Predictions, errors and every running sum behind MSE, MAE, MAPE, R² and the error extremes are
+computed in one pass per cache-sized chunk with reused buffers. Accumulators merge like
+stats.SufficientStats, so a file larger than memory is evaluated chunk by chunk with the same result.
+float32 data is evaluated in float32 within a chunk and the chunk sums are merged in float64.
+"""
+
+import sys
+import time
+import numpy as np
+from reductions import CHUNK_ELEMENTS
+from utils import iter_data_chunks
+
+
+class RegressionMetrics:
+    """Mergeable n, Σerr², Σ|err|, Σ|err/price|, max/min |err| and the price mean and Σ(price-mean)².
+
+    err = price − (θ₀ + θ₁·mileage). The price co-moment is merged with the Chan formula, so R² needs
+    no second pass over the data.
+    """
+
+    def __init__(self, chunk_size=CHUNK_ELEMENTS):
+        self.chunk_size = chunk_size
+        self.n = 0
+        self.sum_squared_error = self.sum_abs_error = self.sum_abs_percentage = 0.0
+        self.max_error, self.min_error = -np.inf, np.inf
+        self.mean_price = self.m2_price = 0.0
+        self._buffers = None
+
+    def update(self, mileage, price, theta0, theta1, weights=None):
+        """Add samples evaluated with (θ₀, θ₁); raises ValueError if any prediction is not finite.
+
+        Positive weights (e.g. duplicate counts) count each sample that many times; n is then their sum.
+        Weights are used in float64 whatever the data dtype.
+        """
+        if not (np.isfinite(theta0) and np.isfinite(theta1)):
+            raise ValueError("Invalid model parameters")
+        dtype = np.float32 if np.asarray(mileage).dtype == np.asarray(price).dtype == np.float32 else np.float64
+        mileage = np.asarray(mileage, dtype=dtype)
+        price = np.asarray(price, dtype=dtype)
+        theta0, theta1 = dtype(theta0), dtype(theta1)
+        if weights is not None:
+            # Counts stay float64: float32 is inexact above 2^24
+            weights = np.asarray(weights, dtype=np.float64)
+        if self._buffers is None or self._buffers[0].dtype != dtype:
+            self._buffers = (np.empty(self.chunk_size, dtype=dtype), np.empty(self.chunk_size, dtype=dtype))
+
+        for start in range(0, len(mileage), self.chunk_size):
+            stop = min(start + self.chunk_size, len(mileage))
+            chunk_weights = None if weights is None else weights[start:stop]
+            self._update_chunk(mileage[start:stop], price[start:stop], theta0, theta1, chunk_weights, *(buffer[: stop - start] for buffer in self._buffers))
+        return self
+
+    def _update_chunk(self, x, price, theta0, theta1, weights, errors, scratch):
+        np.multiply(x, theta1, out=errors)
+        errors += theta0
+        np.subtract(price, errors, out=errors)
+        squared = np.dot(errors, errors) if weights is None else np.dot(np.multiply(errors, weights, out=scratch), errors)
+        if not np.isfinite(squared):
+            raise ValueError("Price calculation resulted in invalid value")
+
+        # Chunk sums are converted to float64 before merging (float32 chunks are reduced in float32)
+        chunk = RegressionMetrics(self.chunk_size)
+        chunk.n, chunk.sum_squared_error = len(x) if weights is None else weights.sum(dtype=np.float64), float(squared)
+        np.abs(errors, out=errors)
+        chunk.max_error, chunk.min_error = float(errors.max()), float(errors.min())
+        chunk.sum_abs_error = float(errors.sum() if weights is None else np.dot(weights, errors))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.abs(np.divide(errors, price, out=scratch), out=scratch)
+        chunk.sum_abs_percentage = float(scratch.sum() if weights is None else np.dot(weights, scratch))
+        chunk.mean_price = price.mean(dtype=np.float64) if weights is None else float(np.dot(weights, price)) / chunk.n
+        np.subtract(price, x.dtype.type(chunk.mean_price), out=scratch)
+        chunk.m2_price = float(np.dot(scratch, scratch) if weights is None else np.dot(np.multiply(scratch, weights, out=errors), scratch))
+        self.merge(chunk)
+
+    def merge(self, other):
+        """Combine another accumulator into this one."""
+        if other.n == 0:
+            return self
+
+        n = self.n + other.n
+        delta = other.mean_price - self.mean_price
+        self.m2_price += other.m2_price + delta * delta * self.n * other.n / n
+        self.mean_price += delta * other.n / n
+        self.sum_squared_error += other.sum_squared_error
+        self.sum_abs_error += other.sum_abs_error
+        self.sum_abs_percentage += other.sum_abs_percentage
+        self.max_error = max(self.max_error, other.max_error)
+        self.min_error = min(self.min_error, other.min_error)
+        self.n = n
+        return self
+
+    def result(self):
+        """Dict of n_samples, mse, rmse, mae, r_squared, max_error, min_error, mean_price and mape (in %)."""
+        if self.n == 0:
+            raise ValueError("No samples evaluated")
+        mse = self.sum_squared_error / self.n
+        r_squared = 1 - self.sum_squared_error / self.m2_price if self.m2_price != 0 else 0
+        return {"n_samples": self.n, "mse": mse, "rmse": np.sqrt(mse), "mae": self.sum_abs_error / self.n, "r_squared": r_squared, "max_error": self.max_error, "min_error": self.min_error, "mean_price": self.mean_price, "mape": self.sum_abs_percentage / self.n * 100}
+
+
+def evaluate_stream(data_file, theta0, theta1, chunk_size=1_000_000):
+    """Metrics of (θ₀, θ₁) over a CSV read chunk by chunk (memory bounded by chunk_size rows)."""
+    metrics = RegressionMetrics()
+    for mileage, price in iter_data_chunks(data_file, chunk_size):
+        metrics.update(mileage, price, theta0, theta1)
+    return metrics.result()
+
+
+def compare_metrics(n_samples=10_000_000, repeats=3, seed=0):
+    """Print the time of the per-sample estimate_price path, separate NumPy passes and RegressionMetrics."""
+    from utils import estimate_price
+
+    rng = np.random.default_rng(seed)
+    mileage = rng.uniform(0, 300_000, n_samples)
+    price = 9000 - 0.02 * mileage + rng.normal(0, 500, n_samples)
+    theta0, theta1 = 9000.0, -0.02
+    print(f"{n_samples:,} samples")
+
+    def separate_passes(predictions, p):
+        errors = p - predictions
+        abs_errors = np.abs(errors)
+        return {"mse": np.mean(errors**2), "mae": np.mean(abs_errors), "r_squared": 1 - np.sum(errors**2) / np.sum((p - np.mean(p)) ** 2), "max_error": np.max(abs_errors), "min_error": np.min(abs_errors), "mape": np.mean(np.abs(errors / p)) * 100}
+
+    sample = min(n_samples, 200_000)
+    start = time.perf_counter()
+    predictions = np.array([estimate_price(x, theta0, theta1) for x in mileage[:sample]])
+    separate_passes(predictions, price[:sample])
+    legacy = (time.perf_counter() - start) * n_samples / sample
+    print(f"  {'estimate_price loop':<20} {legacy:8.3f}s  ({n_samples / legacy:13,.0f} samples/s, extrapolated from {sample:,})")
+
+    reference = separate_passes(theta0 + theta1 * mileage, price)
+    for name, run in (("separate passes", lambda: separate_passes(theta0 + theta1 * mileage, price)), ("fused", lambda: RegressionMetrics().update(mileage, price, theta0, theta1).result())):
+        elapsed = min(_timed(run) for _ in range(repeats))
+        result = run()
+        error = max(abs(result[key] - reference[key]) / abs(reference[key]) for key in reference)
+        print(f"  {name:<20} {elapsed:8.3f}s  ({n_samples / elapsed:13,.0f} samples/s)  {legacy / elapsed:7.1f}x  max rel. difference {error:.1e}")
+
+
+def _timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    compare_metrics(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Compact store for many trained models.
+Records (id, θ₀, θ₁, sample count, training time) are fixed-size rows of a .npy file sorted by id.
+Opening memory-maps the file (no parsing, independent of the number of models) and predictions
+for any number of (id, mileage) pairs are one vectorized lookup and gather.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+from logging_config import get_logger
+
+# Setup logger for model store module
+logger = get_logger(__name__)
+
+RECORD_DTYPE = np.dtype([("id", "<i8"), ("theta0", "<f8"), ("theta1", "<f8"), ("n_samples", "<i8"), ("trained_at", "<f8")])
+
+
+def write_model_store(path, ids, theta0, theta1, n_samples=None, trained_at=None):
+    """Write records sorted by id to path (atomically); ids must be unique integers."""
+    ids = np.asarray(ids)
+    if ids.dtype.kind not in "iu":
+        raise ValueError("Model ids must be integers")
+    records = np.zeros(len(ids), dtype=RECORD_DTYPE)
+    records["id"], records["theta0"], records["theta1"] = ids, theta0, theta1
+    records["n_samples"] = 0 if n_samples is None else n_samples
+    records["trained_at"] = time.time() if trained_at is None else trained_at
+
+    records = records[np.argsort(records["id"], kind="stable")]
+    if np.any(np.diff(records["id"]) == 0):
+        raise ValueError("Duplicate model ids")
+
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, records)
+    os.replace(tmp_path, path)
+    logger.debug(f"{len(records)} models written to {path}")
+
+
+class ModelStore:
+    """Read-only, memory-mapped view of a store written by write_model_store.
+
+    Ids are looked up with np.searchsorted on the sorted id column, or by plain offset when the ids
+    form a contiguous range.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = np.load(path, mmap_mode="r")
+        if self.records.dtype != RECORD_DTYPE or self.records.ndim != 1:
+            raise ValueError(f"'{path}' is not a model store")
+        self.ids = self.records["id"]
+        n = len(self.ids)
+        self._first = int(self.ids[0]) if n else 0
+        self._dense = n > 0 and int(self.ids[-1]) - self._first == n - 1
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, model_id):
+        return bool(self.lookup(np.array([model_id]))[0] >= 0)
+
+    def lookup(self, ids):
+        """Row of every id in the store, -1 for unknown ids (float ids must be integral)."""
+        ids = np.asarray(ids)
+        found = np.ones(ids.shape, dtype=bool)
+        if ids.dtype.kind == "f":
+            found = np.isfinite(ids) & (ids == np.trunc(ids)) & (np.abs(ids) < 2.0**63)
+            ids = np.where(found, ids, 0)
+        ids = ids.astype(np.int64, copy=False)
+        if len(self) == 0:
+            return np.full(ids.shape, -1, dtype=np.intp)
+
+        if self._dense:
+            index = ids - self._first
+            found &= (index >= 0) & (index < len(self))
+        else:
+            index = np.minimum(np.searchsorted(self.ids, ids), len(self) - 1)
+            found &= self.ids[index] == ids
+        return np.where(found, index, -1).astype(np.intp, copy=False)
+
+    def get(self, model_id):
+        """Record of one model as a dict, or None when the id is unknown."""
+        index = self.lookup(np.array([model_id]))[0]
+        if index < 0:
+            return None
+        return {name: self.records[index][name].item() for name in RECORD_DTYPE.names}
+
+    def predict(self, ids, mileage):
+        """Vectorized prices for (id, mileage) pairs; returns (prices, valid) like utils.estimate_prices.
+
+        Unknown ids and non-finite or negative mileages are invalid and give NaN.
+        """
+        mileage = np.asarray(mileage, dtype=np.float64)
+        index = self.lookup(ids)
+        known = index >= 0
+        if len(self) == 0:
+            return np.full(index.shape, np.nan), known
+        # Gathering the two fields is several times faster than gathering whole structured records
+        rows = np.where(known, index, 0)
+        with np.errstate(invalid="ignore", over="ignore"):
+            prices = self.records["theta0"][rows] + self.records["theta1"][rows] * mileage
+            valid = known & np.isfinite(mileage) & (mileage >= 0) & np.isfinite(prices)
+        prices[~valid] = np.nan
+        return prices, valid
+
+
+def compare_lookups(n_models=100_000, n_queries=5_000_000, seed=0, path="model_store_bench.npy"):
+    """Print open and predict times of a JSON dict of models against the memory-mapped store."""
+    import json
+
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(n_models * 10, n_models, replace=False)
+    theta0, theta1 = rng.uniform(5000, 10000, n_models), rng.uniform(-0.03, -0.01, n_models)
+    query_ids, mileage = rng.choice(ids, n_queries), rng.uniform(0, 300_000, n_queries)
+    print(f"{n_models:,} models, {n_queries:,} (id, mileage) pairs")
+
+    text = json.dumps({str(i): {"theta0": a, "theta1": b} for i, a, b in zip(ids.tolist(), theta0.tolist(), theta1.tolist())})
+    start = time.perf_counter()
+    models = json.loads(text)
+    loaded = time.perf_counter()
+    sample = min(n_queries, 200_000)
+    for i, km in zip(query_ids[:sample].tolist(), mileage[:sample].tolist()):
+        params = models[str(i)]
+        params["theta0"] + params["theta1"] * km
+    per_query = (time.perf_counter() - loaded) / sample
+    print(f"  {'JSON dict':<12} open {loaded - start:8.4f}s  predict {per_query * n_queries:8.3f}s (extrapolated)")
+
+    write_model_store(path, ids, theta0, theta1)
+    try:
+        # Same models renumbered 0..n-1: lookups become plain offsets
+        for label, queries in (("store", query_ids), ("store dense", np.searchsorted(np.sort(ids), query_ids))):
+            if label == "store dense":
+                write_model_store(path, np.arange(n_models), theta0[np.argsort(ids)], theta1[np.argsort(ids)])
+            start = time.perf_counter()
+            store = ModelStore(path)
+            loaded = time.perf_counter()
+            prices, valid = store.predict(queries, mileage)
+            elapsed = time.perf_counter() - loaded
+            print(f"  {label:<12} open {loaded - start:8.4f}s  predict {elapsed:8.3f}s  ({n_queries / elapsed:,.0f} pairs/s, {np.count_nonzero(valid):,} valid)")
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    compare_lookups(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Update rules for gradient-based training of LinearRegression.
+Each optimizer turns the gradient of the MSE/2 cost into the next (θ₀, θ₁). Line searches may
+evaluate the cost at trial points, and every evaluation is one pass over the data.
+"""
+
+import sys
+import time
+import numpy as np
+
+OPTIMIZERS = ("gd", "momentum", "nesterov", "adam", "backtracking", "line_search")
+LINE_SEARCHES = ("backtracking", "line_search")
+MAX_STEP = 1e6
+
+
+def decayed_learning_rate(learning_rate, decay, epoch):
+    """Inverse-time decay schedule α₀ / (1 + decay · epoch); decay=0 keeps the step constant."""
+    return learning_rate / (1 + decay * epoch)
+
+
+def quadratic_hessian(mean_x, mean_x2):
+    """Constant Hessian of MSE/2 for h(x) = θ₀ + θ₁x, from E[x] and E[x²] in training coordinates."""
+    return np.array([[1.0, mean_x], [mean_x, mean_x2]])
+
+
+class GradientDescent:
+    """Fixed step θ ← θ − α∇J; the step is clipped to ±1e6 per parameter."""
+
+    def __init__(self, learning_rate):
+        self.learning_rate = learning_rate
+
+    def step(self, theta, gradient, cost, evaluate):
+        """Return the next parameters and the (gradient, cost) there, or None if it was not evaluated."""
+        return theta - np.clip(self.learning_rate * gradient, -MAX_STEP, MAX_STEP), None
+
+
+class Momentum:
+    """Heavy-ball momentum v ← μv − α∇J, θ ← θ + v.
+
+    With nesterov=True the parameters are tracked at the look-ahead point φ = θ + μv, where the
+    gradient is evaluated, using φ ← φ − μv + (1 + μ)v_new. This needs no extra data pass.
+    """
+
+    def __init__(self, learning_rate, momentum=0.9, nesterov=False):
+        self.learning_rate = learning_rate
+        self.momentum = momentum
+        self.nesterov = nesterov
+        self.velocity = np.zeros(2)
+
+    def step(self, theta, gradient, cost, evaluate):
+        velocity = self.momentum * self.velocity - self.learning_rate * gradient
+        update = (1 + self.momentum) * velocity - self.momentum * self.velocity if self.nesterov else velocity
+        self.velocity = velocity
+        return theta + update, None
+
+
+class Adam:
+    """Adam: per-parameter steps from bias-corrected running means of the gradient and its square."""
+
+    def __init__(self, learning_rate, beta1=0.9, beta2=0.999, epsilon=1e-8):
+        self.learning_rate = learning_rate
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self.m = np.zeros(2)
+        self.v = np.zeros(2)
+        self.t = 0
+
+    def step(self, theta, gradient, cost, evaluate):
+        self.t += 1
+        self.m = self.beta1 * self.m + (1 - self.beta1) * gradient
+        self.v = self.beta2 * self.v + (1 - self.beta2) * gradient * gradient
+        m_hat = self.m / (1 - self.beta1**self.t)
+        v_hat = self.v / (1 - self.beta2**self.t)
+        return theta - self.learning_rate * m_hat / (np.sqrt(v_hat) + self.epsilon), None
+
+
+class BacktrackingLineSearch:
+    """Armijo backtracking along −∇J: try twice the last accepted step and halve it until J drops by c·α·‖∇J‖².
+
+    Every trial is one data pass; the accepted trial's (gradient, cost) is reused by the next iteration.
+    """
+
+    def __init__(self, learning_rate, shrink=0.5, armijo=1e-4, max_trials=60):
+        self.step_size = learning_rate
+        self.shrink = shrink
+        self.armijo = armijo
+        self.max_trials = max_trials
+
+    def step(self, theta, gradient, cost, evaluate):
+        squared_norm = gradient @ gradient
+        alpha = self.step_size / self.shrink
+        for _ in range(self.max_trials):
+            candidate = theta - alpha * gradient
+            evaluation = evaluate(candidate)
+            if evaluation[1] <= cost - self.armijo * alpha * squared_norm:
+                break
+            alpha *= self.shrink
+        self.step_size = alpha
+        return candidate, evaluation
+
+
+class ExactLineSearch:
+    """Steepest descent with the exact minimizing step of the quadratic cost, α = ‖g‖² / gᵀHg.
+
+    H is constant (see quadratic_hessian), so the step costs no extra data pass.
+    """
+
+    def __init__(self, hessian):
+        self.hessian = hessian
+
+    def step(self, theta, gradient, cost, evaluate):
+        curvature = gradient @ self.hessian @ gradient
+        if curvature <= 0:
+            return theta, None
+        return theta - (gradient @ gradient / curvature) * gradient, None
+
+
+def make_optimizer(name, learning_rate, hessian):
+    """Build a fresh optimizer; learning_rate is the (initial) step size, hessian is used by line_search."""
+    if name == "gd":
+        return GradientDescent(learning_rate)
+    if name in ("momentum", "nesterov"):
+        return Momentum(learning_rate, nesterov=name == "nesterov")
+    if name == "adam":
+        return Adam(learning_rate)
+    if name == "backtracking":
+        return BacktrackingLineSearch(learning_rate)
+    if name == "line_search":
+        return ExactLineSearch(hessian)
+    raise ValueError(f"Unknown optimizer '{name}' (expected one of {', '.join(OPTIMIZERS)})")
+
+
+def compare_optimizers(n_samples=20000, max_iterations=20000, gtol=1e-6, seed=0):
+    """Print iterations, data passes and wall-clock time per optimizer on data of increasing conditioning.
+
+    Conditioning is set by the offset of x in raw (unnormalized) coordinates, where the Hessian is
+    [[1, E[x]], [E[x], E[x²]]]; the standardized case is what train.py uses by default.
+    Fixed-step methods use α = 1/λmax, Adam α = 0.05. Runs stop when ‖∇J‖ ≤ gtol.
+    """
+    from train import LinearRegression
+
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 0.5, n_samples)
+    cases = [("standardized", 10.0, True), ("raw, E[x]=1", 1.0, False), ("raw, E[x]=3", 3.0, False), ("raw, E[x]=10", 10.0, False)]
+
+    for label, offset, normalize in cases:
+        x = offset + rng.normal(0, 1, n_samples)
+        y = 2.0 + 0.5 * x + noise
+        x_train = (x - x.mean()) / x.std() if normalize else x
+        eigenvalues = np.linalg.eigvalsh(quadratic_hessian(np.mean(x_train), np.mean(x_train * x_train)))
+        exact = np.polyfit(x, y, 1)[::-1]
+        fixed_step = 1 / eigenvalues[-1]
+        print(f"\n{label}: {n_samples} samples, condition number {eigenvalues[-1] / eigenvalues[0]:,.1f}")
+        print(f"  {'optimizer':<12} {'iterations':>10} {'passes':>8} {'seconds':>9} {'max rel. error':>15}")
+
+        for name in OPTIMIZERS:
+            learning_rate = 0.05 if name == "adam" else 1.0 if name == "backtracking" else fixed_step
+            model = LinearRegression(learning_rate=learning_rate, n_iterations=max_iterations, optimizer=name, tol=None, gtol=gtol, normalize=normalize)
+            start = time.perf_counter()
+            try:
+                model.fit(x, y, verbose=False)
+            except ValueError as e:
+                print(f"  {name:<12} {'diverged':>10} ({e})")
+                continue
+            elapsed = time.perf_counter() - start
+            error = np.max(np.abs((np.array([model.theta0_final, model.theta1_final]) - exact) / exact))
+            iterations = f"{len(model.cost_history)}" if model.converged else f">{max_iterations}"
+            print(f"  {name:<12} {iterations:>10} {model.n_passes:>8} {elapsed:9.3f} {error:15.2e}")
+
+
+if __name__ == "__main__":
+    compare_optimizers(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Deferred matplotlib rendering shared by training and evaluation.
+matplotlib is only imported when a plot is actually drawn; figures can be shown, saved headless
+with the Agg backend, or rendered in a background process so the caller carries on while the figure is drawn.
+Large datasets are drawn as density maps, stratified samples and pre-binned histograms so render
+time does not grow with the number of samples.
+"""
+
+import multiprocessing
+import numpy as np
+from logging_config import get_logger
+
+# Setup logger for plotting module
+logger = get_logger(__name__)
+
+MAX_SCATTER_POINTS = 20_000
+DENSITY_BINS = 200
+SAMPLE_STRATA = 50
+
+
+def get_pyplot(backend=None):
+    """Import matplotlib.pyplot on first use; backend (e.g. "Agg") must be chosen before the first import."""
+    import matplotlib
+
+    if backend:
+        matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def add_plot_arguments(parser):
+    """Add the shared --no-plot / --save-plot / --plot-background options to an argparse parser."""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--no-plot", action="store_true", help="skip plotting entirely (matplotlib is never imported)")
+    group.add_argument("--save-plot", metavar="PATH", help="render the figure headless (Agg backend) to PATH instead of opening a window")
+    parser.add_argument("--plot-background", action="store_true", help="render the plot in a separate process so results print without waiting for it; the command still exits only after the plot is saved or its window closed")
+    parser.add_argument("--plot-all-points", action="store_true", help=f"draw every sample as a point even above {MAX_SCATTER_POINTS:,} samples (slow on large data)")
+
+
+def _span(low, high):
+    """(low, high) widened to a unit interval when the data is constant."""
+    low, high = float(low), float(high)
+    return (low, high) if high > low else (low - 0.5, low + 0.5)
+
+
+def _bin_index(values, low, high, bins):
+    """Equal-width bin of every value in [low, high]; out-of-range values land in the edge bins."""
+    index = ((np.asarray(values, dtype=float) - low) * (bins / (high - low))).astype(np.intp)
+    return np.clip(index, 0, bins - 1, out=index)
+
+
+def density_counts(x, y, bins=DENSITY_BINS, weights=None):
+    """2D histogram of (x, y) over the data range with a single bincount; returns (counts, x_edges, y_edges).
+
+    weights (e.g. duplicate counts of compressed rows) count each point that many times.
+    """
+    x_low, x_high = _span(np.min(x), np.max(x))
+    y_low, y_high = _span(np.min(y), np.max(y))
+    flat = _bin_index(x, x_low, x_high, bins) * bins + _bin_index(y, y_low, y_high, bins)
+    counts = np.bincount(flat, weights=weights, minlength=bins * bins).reshape(bins, bins)
+    return counts, np.linspace(x_low, x_high, bins + 1), np.linspace(y_low, y_high, bins + 1)
+
+
+def scatter(x, y, all_points=False, cmap="Blues", weights=None, **kwargs):
+    """plt.scatter for small data; above MAX_SCATTER_POINTS a log-scaled 2D density map of the same points.
+
+    The density map keeps zorder and names its colorbar after label (meshes have no legend entry).
+    all_points forces the raw scatter. weights are duplicate counts of the points for the density map.
+    """
+    plt = get_pyplot()
+    if all_points or len(x) <= MAX_SCATTER_POINTS:
+        return plt.scatter(x, y, **kwargs)
+
+    from matplotlib.colors import LogNorm
+
+    counts, x_edges, y_edges = density_counts(x, y, weights=weights)
+    mesh = plt.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap=cmap, zorder=kwargs.get("zorder"))
+    label = kwargs.get("label")
+    plt.colorbar(mesh, label=f"{label} (samples per bin)" if label else "Samples per bin")
+    return mesh
+
+
+def _stratum_quota(counts, size):
+    """Per-stratum sample sizes summing to at most size: small strata are kept whole, large ones share the rest."""
+    low, high = 0, int(counts.max())
+    while low < high:
+        level = (low + high + 1) // 2
+        if np.minimum(counts, level).sum() <= size:
+            low = level
+        else:
+            high = level - 1
+    return np.minimum(counts, low)
+
+
+def stratified_sample(values, size=MAX_SCATTER_POINTS, strata=SAMPLE_STRATA, seed=0, weights=None):
+    """Sorted indices of about size samples, spread over equal-width strata of values.
+
+    Unlike a uniform sample, sparse regions (tails, outliers) keep their points: each stratum gets the
+    same quota and strata smaller than it are kept entirely. Samples are drawn with a per-stratum
+    keep probability, so it is a single O(n) pass without sorting. With weights (duplicate counts of
+    compressed rows) strata are sized by their weight and a row is kept as often as any of its copies would be.
+    """
+    n = len(values)
+    if n <= size:
+        return np.arange(n)
+
+    stratum = _bin_index(values, *_span(np.min(values), np.max(values)), strata)
+    counts = np.bincount(stratum, weights=weights, minlength=strata)
+    keep_rate = _stratum_quota(np.rint(counts).astype(np.int64), size) / np.maximum(counts, 1)
+    if weights is not None:
+        with np.errstate(divide="ignore"):
+            keep_rate = -np.expm1(np.log1p(-keep_rate)[stratum] * weights)
+        return np.flatnonzero(np.random.default_rng(seed).random(n) < keep_rate)
+    return np.flatnonzero(np.random.default_rng(seed).random(n) < keep_rate[stratum])
+
+
+class StreamingHistogram:
+    """Fixed-edge histogram accumulated chunk by chunk with bincount and plotted from its counts alone.
+
+    Counts are float64 so weighted values (duplicate counts of compressed rows) add up exactly.
+    """
+
+    def __init__(self, low, high, bins=50):
+        low, high = _span(low, high)
+        self.edges = np.linspace(low, high, bins + 1)
+        self.counts = np.zeros(bins)
+
+    @classmethod
+    def from_array(cls, values, bins=50, chunk_size=1_000_000, weights=None):
+        """Histogram over the range of values, counted in chunks so temporaries stay bounded."""
+        histogram = cls(np.min(values), np.max(values), bins)
+        for start in range(0, len(values), chunk_size):
+            histogram.update(values[start : start + chunk_size], None if weights is None else weights[start : start + chunk_size])
+        return histogram
+
+    def update(self, values, weights=None):
+        """Add a chunk of values (each counted weight times when weights are given); values outside the edges are counted in the first/last bin."""
+        bins = len(self.counts)
+        self.counts += np.bincount(_bin_index(values, self.edges[0], self.edges[-1], bins), weights=weights, minlength=bins)
+        return self
+
+    def plot(self, **kwargs):
+        """Draw the counts as a histogram (plt.hist keyword arguments are accepted)."""
+        return get_pyplot().hist(self.edges[:-1], self.edges, weights=self.counts, **kwargs)
+
+
+def _render(draw, args, save_path):
+    plt = get_pyplot("Agg" if save_path else None)
+    draw(*args)
+    if save_path:
+        plt.savefig(save_path, dpi=100, bbox_inches="tight")
+        plt.close("all")
+        logger.info(f"Plot saved to {save_path}")
+    else:
+        plt.show()
+
+
+def render(draw, *args, save_path=None, background=False):
+    """Call draw(*args) to build the current figure, then save it to save_path or show it.
+
+    With background=True the rendering runs in a separate (non-daemon) process: the caller continues
+    immediately and the interpreter waits for the plot to be written or its window closed on exit.
+    Returns the process in that case, else None.
+    """
+    if not background:
+        _render(draw, args, save_path)
+        return None
+
+    process = multiprocessing.Process(target=_render, args=(draw, args, save_path), name="plot-renderer")
+    process.start()
+    logger.debug(f"Rendering plot in background process {process.pid}")
+    return process
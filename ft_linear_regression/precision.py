@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Accuracy guard of the compact float32 mode.
+Trains and evaluates the same data stored as float64 and as float32 and reports the relative drift
+of θ₀, θ₁ and the metrics against FLOAT32_TOLERANCE. `python3 precision.py` exits with status 1
+when any drift exceeds it, so `make test` fails if a change breaks the float64 reductions.
+"""
+
+import sys
+import time
+import numpy as np
+from metrics import RegressionMetrics
+
+# Largest accepted relative difference between the float32 and float64 results
+FLOAT32_TOLERANCE = 1e-6
+
+
+def _relative(a, b):
+    return abs(a - b) / max(abs(b), np.finfo(np.float64).tiny)
+
+
+def precision_drift(mileage, price):
+    """{quantity: relative difference of the float32 result to the float64 one} for θ and the metrics.
+
+    Quantities are θ₀/θ₁ of the exact solver, of gradient descent (learning rate 0.5) and of the
+    learning rate search, and mse, mae, mape and r_squared of the exact fit.
+    """
+    from train import LinearRegression, optimize_hyperparameters
+
+    methods = (
+        ("exact", lambda x, y: LinearRegression(solver="exact").fit(x, y, verbose=False)),
+        ("gd", lambda x, y: LinearRegression(learning_rate=0.5).fit(x, y, verbose=False)),
+        ("search", lambda x, y: optimize_hyperparameters(x, y)[1]),
+    )
+    compact = np.asarray(mileage, dtype=np.float32), np.asarray(price, dtype=np.float32)
+    reference = np.asarray(mileage, dtype=np.float64), np.asarray(price, dtype=np.float64)
+
+    drift = {}
+    for name, train in methods:
+        wide, narrow = train(*reference), train(*compact)
+        drift[f"{name} theta0"] = _relative(narrow.theta0_final, wide.theta0_final)
+        drift[f"{name} theta1"] = _relative(narrow.theta1_final, wide.theta1_final)
+        if name == "exact":
+            theta = (wide.theta0_final, wide.theta1_final)
+    wide = RegressionMetrics().update(*reference, *theta).result()
+    narrow = RegressionMetrics().update(*compact, *theta).result()
+    for key in ("mse", "mae", "mape", "r_squared"):
+        drift[key] = _relative(narrow[key], wide[key])
+    return drift
+
+
+def compare_precision(n_samples=2_000_000, seed=0, tolerance=FLOAT32_TOLERANCE):
+    """Print the memory and time of a fixed-rate fit in float64 and float32 and the drift of every quantity; returns True within tolerance."""
+    from train import LinearRegression
+
+    rng = np.random.default_rng(seed)
+    mileage = rng.uniform(0, 300_000, n_samples)
+    price = 9000 - 0.02 * mileage + rng.normal(0, 500, n_samples)
+    print(f"{n_samples:,} samples")
+
+    for dtype in (np.float64, np.float32):
+        x, y = mileage.astype(dtype), price.astype(dtype)
+        model = LinearRegression(learning_rate=0.5)
+        start = time.perf_counter()
+        model.fit(x, y, verbose=False)
+        elapsed = time.perf_counter() - start
+        # Raw and normalized columns are the arrays held during training
+        print(f"  {np.dtype(dtype).name:<8} data {4 * x.nbytes / 1e6:7.1f} MB  gd fit {elapsed:7.3f}s  ({model.n_passes} passes)")
+
+    within = True
+    for name, value in precision_drift(mileage, price).items():
+        within &= value <= tolerance
+        print(f"  {name:<16} drift {value:.1e}  {'ok' if value <= tolerance else f'ABOVE {tolerance:.0e}'}")
+    return within
+
+
+if __name__ == "__main__":
+    sys.exit(0 if compare_precision(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000) else 1)
@@ -1,29 +1,46 @@
 #!/usr/bin/env python3
 """
 Price prediction script for linear regression model.
-Loads trained model parameters and predicts car prices based on mileage.
+Loads trained model parameters and predicts car prices based on mileage,
+either interactively or in batch over a file of mileages.
 """
 
-from utils import estimate_price, load_model_params
-from logging_config import get_logger
+import argparse
+import sys
+import time
+import warnings
+import numpy as np
+from bootstrap import DEFAULT_REPLICATES, Bootstrap
+from csv_reader import MAX_REPORTED_ERRORS
+from model_store import ModelStore
+from utils import estimate_price, estimate_prices, load_data, load_model_params
+from logging_config import configure_logging, get_logger
 
 # Setup logger for prediction module
 logger = get_logger(__name__)
 
 
+OUTPUT_FORMATS = ("csv", "bin")
+
+
+def _load_parameters(warning_stream=sys.stdout):
+    """Load θ₀/θ₁, falling back to zeros when no model has been trained."""
+    params = load_model_params()
+    if not params:
+        print("Warning: No trained model found, using default parameters (predictions will be 0)", file=warning_stream)
+        return 0, 0
+
+    theta0 = params["theta0"]
+    theta1 = params["theta1"]
+    logger.debug(f"Model loaded: θ₀={theta0:.6f}, θ₁={theta1:.6f}")
+    return theta0, theta1
+
+
 def predict():
     """Main prediction function with interactive input."""
     logger.debug("Starting prediction function")
 
-    params = load_model_params()
-    if not params:
-        print("Warning: No trained model found, using default parameters (predictions will be 0)")
-        theta0 = 0
-        theta1 = 0
-    else:
-        theta0 = params["theta0"]
-        theta1 = params["theta1"]
-        logger.debug(f"Model loaded: θ₀={theta0:.6f}, θ₁={theta1:.6f}")
+    theta0, theta1 = _load_parameters()
 
     try:
         mileage = float(input("Enter the car's mileage (in km): "))
@@ -57,5 +74,280 @@ def predict():
         return 1
 
 
+def _parse_first_field(line):
+    """Parse the first comma-separated field of a line, NaN when it is not a number."""
+    try:
+        return float(line.split(b",", 1)[0])
+    except ValueError:
+        return np.nan
+
+
+def _parse_fields(line, n_fields):
+    """Parse the first n_fields comma-separated fields of a line, all NaN when any is missing or not a number."""
+    fields = line.split(b",", n_fields)[:n_fields]
+    try:
+        if len(fields) == n_fields:
+            return [float(field) for field in fields]
+    except ValueError:
+        pass
+    return [np.nan] * n_fields
+
+
+def _is_rectangular(block, n_lines, n_columns):
+    """True when every line holds exactly n_columns non-empty fields without blanks.
+
+    Newlines must sit at every n_columns-th separator and nowhere else (as in csv_reader._parse_decimal_block),
+    so a value count of n_lines * n_columns cannot come from ragged lines that happen to add up.
+    """
+    if b" " in block or b"\t" in block:
+        return False
+    raw = np.frombuffer(block if block.endswith(b"\n") else block + b"\n", dtype=np.uint8)
+    sep_pos = np.flatnonzero((raw == 44) | (raw == 10))
+    if len(sep_pos) != n_lines * n_columns or not np.all(raw[sep_pos[n_columns - 1 :: n_columns]] == 10):
+        return False
+    return bool(np.diff(sep_pos, prepend=-1).min() > 1)
+
+
+def _parse_block(block, n_fields=1):
+    """Parse a block of complete lines into an (n_lines, n_fields) array of the first columns.
+
+    A block whose lines all have the same field count is parsed in one np.fromstring call; blocks with
+    empty, ragged or malformed lines fall back to per-line parsing so every input line still maps to
+    exactly one output row (NaN when it lacks n_fields numeric fields), never to fields of its neighbours.
+    """
+    block = block.replace(b"\r\n", b"\n") if b"\r" in block else block
+    n_lines = block.count(b"\n") + (not block.endswith(b"\n"))
+    n_columns = block[: block.find(b"\n")].count(b",") + 1
+
+    values = None
+    if n_columns >= n_fields and _is_rectangular(block, n_lines, n_columns):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", DeprecationWarning)
+            try:
+                values = np.fromstring(block.replace(b",", b" ").decode("ascii"), sep=" ")
+            except (DeprecationWarning, ValueError, UnicodeDecodeError):
+                values = None
+
+    if values is not None and values.size == n_lines * n_columns:
+        return values.reshape(n_lines, n_columns)[:, :n_fields]
+    return np.array([_parse_fields(line, n_fields) for line in block.split(b"\n")[:n_lines]], dtype=np.float64).reshape(n_lines, n_fields)
+
+
+def _iter_text_blocks(stream, block_bytes):
+    """Yield blocks of whole lines read from a binary stream, skipping a non-numeric header line."""
+    remainder, first = b"", True
+    while True:
+        data = stream.read(block_bytes)
+        block = remainder + data
+        if not data:
+            remainder = b""
+        else:
+            cut = block.rfind(b"\n") + 1
+            block, remainder = block[:cut], block[cut:]
+        if first and block:
+            first = False
+            header_end = block.find(b"\n") + 1 or len(block)
+            if np.isnan(_parse_first_field(block[:header_end].strip())):
+                block = block[header_end:]
+        if block:
+            yield block
+        if not data:
+            break
+
+
+def iter_mileage_chunks(source, chunk_size=1_000_000):
+    """Yield float64 mileage arrays from a .npy file, or from text with one mileage per line ('-' for stdin).
+
+    For text input the first comma-separated column is used and chunk_size is approximate.
+    """
+    if source != "-" and source.endswith(".npy"):
+        data = np.load(source, mmap_mode="r")
+        for start in range(0, len(data), chunk_size):
+            yield np.asarray(data[start : start + chunk_size], dtype=np.float64)
+        return
+
+    stream = sys.stdin.buffer if source == "-" else open(source, "rb")
+    try:
+        for block in _iter_text_blocks(stream, chunk_size * 16):
+            yield _parse_block(block)[:, 0]
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def iter_store_chunks(source, chunk_size=1_000_000):
+    """Yield (ids, mileage) float64 arrays from text with one `id,km` row per line ('-' for stdin).
+
+    Every input line gives one row; lines without two numeric fields give NaN for both and are logged as
+    errors with their row number (the first MAX_REPORTED_ERRORS of them). chunk_size is approximate.
+    """
+    stream = sys.stdin.buffer if source == "-" else open(source, "rb")
+    row = reported = 0
+    try:
+        for block in _iter_text_blocks(stream, chunk_size * 24):
+            rows = _parse_block(block, 2)
+            malformed = np.flatnonzero(np.isnan(rows).any(axis=1))
+            if len(malformed) and reported < MAX_REPORTED_ERRORS:
+                lines = block.split(b"\n")
+                for index in malformed[: MAX_REPORTED_ERRORS - reported]:
+                    logger.error(f"Row {row + index + 1}: expected id,km but got {lines[index].rstrip()[:80]!r}; written as NaN")
+                reported += min(len(malformed), MAX_REPORTED_ERRORS - reported)
+            row += len(rows)
+            yield rows[:, 0], rows[:, 1]
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+_POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.uint64)
+
+
+def _format_fixed(values, decimals):
+    """Right-aligned ASCII byte matrix of values in fixed-point notation (0 bytes are padding).
+
+    Digits are extracted with vectorized integer arithmetic, one column per decimal position, so a whole
+    chunk is formatted without a Python-level loop over rows. Non-finite values become 'nan'.
+    """
+    finite = np.isfinite(values)
+    scaled = np.rint(np.abs(np.where(finite, values, 0.0)) * 10.0**decimals).astype(np.uint64)
+    row_digits = np.maximum(np.searchsorted(_POWERS_OF_TEN, scaled, side="right") + 1, decimals + 1)
+    n_digits = max(int(row_digits.max(initial=1)), 3)
+    width = n_digits + 1 + (decimals > 0)
+
+    out = np.zeros((len(values), width), dtype=np.uint8)
+    column = width - 1
+    for position in range(n_digits):
+        if decimals and position == decimals:
+            out[:, column] = ord(".")
+            column -= 1
+        out[:, column] = np.where(position < row_digits, scaled % 10 + ord("0"), 0)
+        scaled //= 10
+        column -= 1
+
+    negative = np.flatnonzero(finite & (values < 0))
+    out[negative, width - 1 - row_digits[negative] - (decimals > 0)] = ord("-")
+    out[~finite] = 0
+    out[~finite, -3:] = np.frombuffer(b"nan", dtype=np.uint8)
+    return out
+
+
+def _format_csv_rows(mileage, prices, *bounds, ids=None):
+    """Format `km,price` rows (mileage with 0 decimals, prices with 2) as bytes; bounds add `low,high` price columns and ids a leading `id` column."""
+    keys = (mileage,) if ids is None else (ids, mileage)
+    columns = (prices, *bounds)
+    if any(np.any(np.abs(k[np.isfinite(k)]) >= 1e17) for k in keys) or any(np.any(np.abs(c[np.isfinite(c)]) >= 1e15) for c in columns):
+        return "".join(",".join(f"{key:.0f}" for key in row[: len(keys)]) + "," + ",".join(f"{value:.2f}" for value in row[len(keys) :]) + "\n" for row in zip(*(c.tolist() for c in keys + columns))).encode()
+
+    separator = np.full((len(prices), 1), ord(","), dtype=np.uint8)
+    newline = np.full((len(prices), 1), ord("\n"), dtype=np.uint8)
+    parts = [_format_fixed(keys[0], 0)]
+    for key in keys[1:]:
+        parts += [separator, _format_fixed(key, 0)]
+    for column in columns:
+        parts += [separator, _format_fixed(column, 2)]
+    rows = np.concatenate(parts + [newline], axis=1)
+    return rows[rows != 0].tobytes()
+
+
+def _write_chunk(out, mileage, prices, output_format, bounds=(), ids=None):
+    """Write one chunk of predictions as `[id,]km,price[,low,high]` CSV rows or raw little-endian float64 prices.
+
+    With bounds, binary output holds one (price, low, high) triple per row.
+    """
+    if output_format == "bin":
+        out.write(np.column_stack((prices, *bounds)).astype("<f8", copy=False).tobytes())
+    else:
+        out.write(_format_csv_rows(mileage, prices, *bounds, ids=ids))
+
+
+def predict_batch(source, output="-", output_format="csv", chunk_size=1_000_000, store=None, interval=None, replicates=DEFAULT_REPLICATES, data_file="data.csv"):
+    """Score every mileage of `source` chunk by chunk with vectorized validation.
+
+    With store (a model store path, see model_store.py), `source` is a CSV of `id,km` rows and each row
+    is priced by the model with that id and CSV output has `id,km,price` rows. Malformed rows and unknown ids
+    give NaN, so output rows always match input rows one to one.
+    interval (e.g. 0.95) adds the bounds of a bootstrap prediction interval at that level, from
+    `replicates` resamples of data_file (see bootstrap.py).
+    """
+    bootstrap = None
+    if interval is not None:
+        mileage, price = load_data(data_file)
+        if mileage is None:
+            raise ValueError(f"Failed to load training data from {data_file}")
+        bootstrap = Bootstrap(replicates).fit(mileage, price)
+        logger.debug(f"Bootstrap of {replicates} replicates fitted on {len(mileage)} samples")
+
+    if store is not None:
+        models = ModelStore(store)
+        logger.debug(f"Model store loaded: {len(models)} models")
+        chunks = ((ids, mileage, models.predict(ids, mileage)) for ids, mileage in iter_store_chunks(source, chunk_size))
+    else:
+        theta0, theta1 = _load_parameters(warning_stream=sys.stderr)
+        chunks = ((None, mileage, estimate_prices(mileage, theta0, theta1)) for mileage in iter_mileage_chunks(source, chunk_size))
+
+    out = sys.stdout.buffer if output == "-" else open(output, "wb")
+    total = invalid = 0
+    start = time.perf_counter()
+    try:
+        if output_format == "csv":
+            out.write(b"id,km,price\n" if store is not None else b"km,price,low,high\n" if bootstrap else b"km,price\n")
+        for ids, mileage, (prices, valid) in chunks:
+            bounds = bootstrap.price_intervals(np.where(valid, mileage, np.nan), interval) if bootstrap else ()
+            _write_chunk(out, mileage, prices, output_format, bounds, ids)
+            total += len(prices)
+            invalid += int(len(valid) - np.count_nonzero(valid))
+        out.flush()
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    if invalid:
+        logger.warning(f"{invalid} invalid {'rows (malformed, unknown model id or invalid mileage)' if store else 'mileage values (non-numeric, non-finite or negative)'} written as NaN")
+    logger.info(f"Predicted {total} prices in {elapsed:.3f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return 0
+
+
+def parse_args(argv=None):
+    """Parse command line options for prediction."""
+    parser = argparse.ArgumentParser(description="Predict car prices from mileage (interactive without --batch).")
+    parser.add_argument("--batch", metavar="FILE", help="score mileages from FILE (.npy, or text/CSV with one mileage per line; '-' for stdin)")
+    parser.add_argument("--output", default="-", help="batch output file (default: stdout)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="batch output: 'csv' (km,price) or 'bin' (raw float64 prices)")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="mileages scored per chunk in batch mode (default: 1000000)")
+    parser.add_argument("--interval", type=float, metavar="LEVEL", help="batch mode: add low,high columns of a bootstrap prediction interval at LEVEL (e.g. 0.95), resampling data.csv")
+    parser.add_argument("--replicates", type=int, default=DEFAULT_REPLICATES, help=f"bootstrap resamples for --interval (default: {DEFAULT_REPLICATES})")
+    parser.add_argument("--store", metavar="PATH", help="batch mode with a model store (e.g. segment_models.npy): FILE is a CSV of id,km rows, output has id,km,price rows")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Dispatch to interactive or batch prediction."""
+    args = parse_args(argv)
+    if args.batch is None:
+        if args.store:
+            logger.error("--store requires --batch FILE (a CSV of id,km rows)")
+            return 1
+        if args.interval is not None:
+            logger.error("--interval requires --batch FILE")
+            return 1
+        return predict()
+    if args.interval is not None and (args.store or not 0 < args.interval < 1):
+        logger.error("--interval needs a level between 0 and 1 and cannot be combined with --store")
+        return 1
+
+    if args.output == "-":
+        configure_logging(stream=sys.stderr)
+
+    try:
+        return predict_batch(args.batch, args.output, args.format, args.chunk_size, args.store, args.interval, args.replicates)
+    except FileNotFoundError as e:
+        logger.error(f"Input file not found: {e.filename}")
+        return 1
+    except Exception as e:
+        logger.error(f"Batch prediction failed: {e}")
+        return 1
+
+
 if __name__ == "__main__":
-    exit(predict())
+    exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Fused error-sum reductions for gradient descent.
+Σerr, Σerr·x and Σerr² are computed in one pass per cache-sized chunk with reused buffers instead of
+one full-size temporary per reduction. Chunks are spread over a thread pool (NumPy ufuncs release
+the GIL) and the per-chunk partials are combined in chunk order, so results do not depend on the
+number of threads. float32 data is reduced in float32 within a chunk (pairwise sums) and the
+partials are combined in float64.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+CHUNK_ELEMENTS = 1 << 15
+MIN_CHUNKS_PER_WORKER = 2
+
+
+def _chunk_sums(x, y, theta0, theta1, errors, product, weights=None):
+    """[Σerr, Σerr·x, Σerr²] of one chunk (each term times its weight when given); errors/product are scratch buffers of the chunk's length."""
+    np.multiply(x, theta1, out=errors)
+    errors += theta0
+    errors -= y
+    if weights is not None:
+        np.multiply(errors, weights, out=product)
+        return product.sum(), np.dot(product, x), np.dot(product, errors)
+    return errors.sum(), np.multiply(errors, x, out=product).sum(), np.multiply(errors, errors, out=product).sum()
+
+
+class FusedReducer:
+    """Computes [Σerr, Σerr·x, Σerr²] for err = θ₀ + θ₁x − y over cache-sized chunks on a thread pool.
+
+    Each worker owns two scratch buffers of chunk_size elements (x, y and both buffers stay in L2)
+    and reduces a contiguous range of chunks. Inputs smaller than MIN_CHUNKS_PER_WORKER chunks per
+    worker use fewer threads; a single chunk runs inline without touching the pool.
+    """
+
+    def __init__(self, workers=None, chunk_size=CHUNK_ELEMENTS):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._buffers = [None] * self.workers
+        self._pool = None
+
+    def _scratch(self, worker, dtype):
+        if self._buffers[worker] is None or self._buffers[worker][0].dtype != dtype:
+            self._buffers[worker] = (np.empty(self.chunk_size, dtype=dtype), np.empty(self.chunk_size, dtype=dtype))
+        return self._buffers[worker]
+
+    def _reduce_range(self, worker, x, y, theta0, theta1, weights, partials, first, last):
+        errors, product = self._scratch(worker, x.dtype)
+        for c in range(first, last):
+            start = c * self.chunk_size
+            stop = min(start + self.chunk_size, len(x))
+            partials[c] = _chunk_sums(x[start:stop], y[start:stop], theta0, theta1, errors[: stop - start], product[: stop - start], None if weights is None else weights[start:stop])
+
+    def error_sums(self, x, y, theta0, theta1, weights=None):
+        """Return np.array([Σerr, Σerr·x, Σerr²]) for the given parameters, with every term times its sample weight when given.
+
+        Errors are computed in the dtype of x (float32 or float64); the returned sums are float64.
+        """
+        # Parameters in the data's dtype, so float32 chunks are not promoted to float64
+        theta0, theta1 = x.dtype.type(theta0), x.dtype.type(theta1)
+        n_chunks = -(-len(x) // self.chunk_size)
+        partials = np.zeros((max(n_chunks, 1), 3))
+        workers = max(1, min(self.workers, n_chunks // MIN_CHUNKS_PER_WORKER))
+
+        if workers == 1:
+            self._reduce_range(0, x, y, theta0, theta1, weights, partials, 0, n_chunks)
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reducer")
+            bounds = [n_chunks * w // workers for w in range(workers + 1)]
+            futures = [self._pool.submit(self._reduce_range, w, x, y, theta0, theta1, weights, partials, bounds[w], bounds[w + 1]) for w in range(workers)]
+            for future in futures:
+                future.result()
+
+        # Fixed chunk order: the same sums whatever the number of workers
+        return partials.sum(axis=0)
+
+    def close(self):
+        """Shut the thread pool down; it is recreated on the next parallel call."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def compare_reductions(n_samples=10_000_000, repeats=5, workers=os.cpu_count()):
+    """Print the time of the separate NumPy reductions against the fused reducer with 1..workers threads."""
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=n_samples)
+    y = 0.3 - 0.8 * x + rng.normal(size=n_samples)
+    theta0, theta1 = 0.1, -0.5
+
+    def separate():
+        errors = theta0 + theta1 * x - y
+        return np.array([np.sum(errors), np.sum(errors * x), np.sum(errors**2)])
+
+    candidates = [("separate reductions", separate)]
+    thread_counts = sorted({1, 2, 4, 8, 16, 32, 64, workers} & set(range(1, workers + 1)))
+    reducers = [FusedReducer(count) for count in thread_counts]
+    candidates += [(f"fused, {count} thread(s)", lambda reducer=reducer: reducer.error_sums(x, y, theta0, theta1)) for count, reducer in zip(thread_counts, reducers)]
+
+    print(f"{n_samples:,} samples, best of {repeats}")
+    baseline = None
+    for name, run in candidates:
+        run()
+        best = min(_timed(run) for _ in range(repeats))
+        baseline = baseline or best
+        print(f"  {name:<24} {best * 1000:8.2f} ms  {baseline / best:5.2f}x")
+    for reducer in reducers:
+        reducer.close()
+
+
+def _timed(run):
+    start = time.perf_counter()
+    run()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    compare_reductions(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Independent linear regressions per segment (make, model, region...) fitted all at once.
+Rows are grouped once into integer codes, and every per-segment sum is a weighted np.bincount, so
+thousands of (θ₀, θ₁) pairs come out of a few vectorized passes instead of a Python loop per segment.
+"""
+
+import sys
+import time
+import numpy as np
+from training_trace import denormalize
+from model_store import write_model_store
+from logging_config import get_logger
+
+# Setup logger for segments module
+logger = get_logger(__name__)
+
+SEGMENT_MODELS_FILE = "segment_models.npy"
+SEGMENT_SOLVERS = ("exact", "gd")
+
+
+def segment_codes(groups):
+    """(sorted unique segment ids, code of every row into them); integral float ids become int64.
+
+    Integer ids spanning a range not much larger than the number of rows are coded in O(n) with a
+    bincount; other ids fall back to np.unique (a sort).
+    """
+    groups = np.asarray(groups)
+    if len(groups) and groups.dtype.kind in "fiu":
+        low, high = groups.min(), groups.max()
+        if np.isfinite(low) and np.isfinite(high) and high - low <= 4 * len(groups):
+            offsets = (groups - low).astype(np.intp)
+            if groups.dtype.kind != "f" or np.array_equal(offsets + low, groups):
+                present = np.bincount(offsets) > 0
+                remap = np.cumsum(present) - 1
+                return np.flatnonzero(present).astype(np.int64) + np.int64(low), remap[offsets]
+
+    ids, codes = np.unique(groups, return_inverse=True)
+    if ids.dtype.kind == "f" and np.all(np.isfinite(ids)) and np.all(ids == np.round(ids)):
+        ids = ids.astype(np.int64)
+    return ids, codes.ravel()
+
+
+class SegmentStats:
+    """Per-segment count, means, Σ(x-x̄)², Σ(y-ȳ)² and Σ(x-x̄)(y-ȳ) as arrays indexed by segment code.
+
+    Means come from one bincount pass and co-moments from a second, centered one (the same
+    numerically stable form as stats.SufficientStats).
+    """
+
+    def __init__(self, codes, x, y, n_segments):
+        self.n = np.bincount(codes, minlength=n_segments)
+        counts = np.maximum(self.n, 1)
+        self.mean_x = np.bincount(codes, x, n_segments) / counts
+        self.mean_y = np.bincount(codes, y, n_segments) / counts
+        dx = x - self.mean_x[codes]
+        dy = y - self.mean_y[codes]
+        self.m2_x = np.bincount(codes, dx * dx, n_segments)
+        self.m2_y = np.bincount(codes, dy * dy, n_segments)
+        self.c_xy = np.bincount(codes, dx * dy, n_segments)
+
+    @property
+    def std_x(self):
+        """Population standard deviation of x per segment."""
+        return np.sqrt(self.m2_x / np.maximum(self.n, 1))
+
+    @property
+    def std_y(self):
+        """Population standard deviation of y per segment."""
+        return np.sqrt(self.m2_y / np.maximum(self.n, 1))
+
+    def solve(self):
+        """Least-squares (θ₀, θ₁) arrays; θ₁ is 0 for segments whose x is constant."""
+        theta1 = np.divide(self.c_xy, self.m2_x, out=np.zeros_like(self.c_xy), where=self.m2_x > 0)
+        return self.mean_y - theta1 * self.mean_x, theta1
+
+
+class SegmentedRegression:
+    """One (θ₀, θ₁) per segment, all fitted together.
+
+    solver="exact" solves every segment in closed form from SegmentStats. solver="gd" runs batched
+    gradient descent on (θ₀, θ₁) vectors over per-segment standardized data, with one set of
+    segmented reductions per iteration; converged segments stop updating.
+    """
+
+    def __init__(self, solver="exact", learning_rate=0.5, n_iterations=1000, tol=1e-6):
+        if solver not in SEGMENT_SOLVERS:
+            raise ValueError(f"Unknown solver '{solver}' (expected one of {', '.join(SEGMENT_SOLVERS)})")
+        if learning_rate <= 0:
+            raise ValueError("Learning rate must be positive")
+        self.solver = solver
+        self.learning_rate = learning_rate
+        self.n_iterations = n_iterations
+        self.tol = tol
+        self.n_iterations_run = 0
+
+    def fit(self, X, y, groups, verbose=True):
+        """Group the rows once and fit every segment; sets segment_ids, n_samples, theta0 and theta1."""
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.segment_ids, codes = segment_codes(groups)
+        stats = SegmentStats(codes, X, y, len(self.segment_ids))
+        self.n_samples = stats.n
+        if verbose:
+            logger.info(f"Fitting {len(self.segment_ids)} segments on {len(X)} samples ({self.solver})...")
+
+        if self.solver == "exact":
+            self.theta0, self.theta1 = stats.solve()
+        else:
+            self._gradient_descent(codes, X, y, stats)
+
+        small = np.count_nonzero(stats.n < 2)
+        if small and verbose:
+            logger.warning(f"{small} segments have fewer than 2 samples; their slope is 0")
+        return self
+
+    def _gradient_descent(self, codes, X, y, stats):
+        n_segments = len(self.segment_ids)
+        std_x = np.where(stats.std_x > 0, stats.std_x, 1.0)
+        std_y = np.where(stats.std_y > 0, stats.std_y, 1.0)
+        X_norm = (X - stats.mean_x[codes]) / std_x[codes]
+        y_norm = (y - stats.mean_y[codes]) / std_y[codes]
+        counts = np.maximum(stats.n, 1)
+
+        theta0, theta1 = np.zeros(n_segments), np.zeros(n_segments)
+        prev_cost = np.full(n_segments, np.inf)
+        active = np.ones(n_segments, dtype=bool)
+        for i in range(self.n_iterations):
+            self.n_iterations_run = i + 1
+            errors = theta0[codes] + theta1[codes] * X_norm - y_norm
+            cost = np.bincount(codes, errors * errors, n_segments) / counts / 2
+            step = np.where(active, self.learning_rate / counts, 0.0)
+            theta0 -= step * np.bincount(codes, errors, n_segments)
+            theta1 -= step * np.bincount(codes, errors * X_norm, n_segments)
+            if not (np.all(np.isfinite(theta0)) and np.all(np.isfinite(theta1))):
+                raise ValueError("Numerical divergence")
+
+            active &= ~(np.abs(prev_cost - cost) < self.tol)
+            prev_cost = cost
+            if not active.any():
+                break
+        self.theta0, self.theta1 = denormalize(theta0, theta1, stats.mean_x, std_x, stats.mean_y, std_y)
+
+    def predict(self, segment_ids, mileage):
+        """Prices for (segment id, mileage) pairs; unknown segments give NaN."""
+        segment_ids = np.asarray(segment_ids)
+        mileage = np.asarray(mileage, dtype=float)
+        index = np.clip(np.searchsorted(self.segment_ids, segment_ids), 0, len(self.segment_ids) - 1)
+        known = self.segment_ids[index] == segment_ids
+        return np.where(known, self.theta0[index] + self.theta1[index] * mileage, np.nan)
+
+    def save(self, filename=SEGMENT_MODELS_FILE):
+        """Save (segment id, θ₀, θ₁, sample count) records to a model store (see model_store.py)."""
+        write_model_store(filename, self.segment_ids, self.theta0, self.theta1, self.n_samples)
+        logger.info(f"{len(self.segment_ids)} segment models saved to {filename}")
+
+
+def compare_segment_training(n_samples=2_000_000, n_segments=20_000, loop_segments=500, seed=0):
+    """Print the time of one LinearRegression per segment (extrapolated from loop_segments) against SegmentedRegression."""
+    from train import LinearRegression
+
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, n_segments, n_samples)
+    slopes = rng.uniform(-0.03, -0.01, n_segments)
+    x = rng.uniform(0, 300_000, n_samples)
+    y = 9000 + slopes[groups] * x + rng.normal(0, 300, n_samples)
+    print(f"{n_samples:,} samples, {n_segments:,} segments")
+
+    start = time.perf_counter()
+    order = np.argsort(groups, kind="stable")
+    bounds = np.searchsorted(groups[order], np.arange(loop_segments + 1))
+    grouping = time.perf_counter() - start
+    reference = np.empty((2, loop_segments))
+    start = time.perf_counter()
+    for g in range(loop_segments):
+        rows = order[bounds[g] : bounds[g + 1]]
+        model = LinearRegression(solver="exact").fit(x[rows], y[rows], verbose=False)
+        reference[:, g] = model.theta0_final, model.theta1_final
+    loop = grouping + (time.perf_counter() - start) * n_segments / loop_segments
+    print(f"  {'LinearRegression loop':<24} {loop:8.2f}s  (argsort + per-segment fits extrapolated from {loop_segments} segments)")
+
+    for solver in SEGMENT_SOLVERS:
+        start = time.perf_counter()
+        model = SegmentedRegression(solver=solver).fit(x, y, groups, verbose=False)
+        elapsed = time.perf_counter() - start
+        fitted = np.vstack([model.theta0, model.theta1])[:, :loop_segments]
+        error = np.max(np.abs(fitted - reference) / np.abs(reference))
+        print(f"  {'SegmentedRegression ' + solver:<24} {elapsed:8.2f}s  {loop / elapsed:7.1f}x  max rel. difference to the loop {error:.1e}")
+
+
+if __name__ == "__main__":
+    compare_segment_training(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000, int(sys.argv[2]) if len(sys.argv) > 2 else 20_000)
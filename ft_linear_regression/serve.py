@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Asynchronous prediction server for the linear regression model.
+Serves estimate_price over HTTP (TCP or Unix socket), coalesces concurrent requests into
+NumPy micro-batches and hot-reloads model_params.json without dropping in-flight requests.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from utils import estimate_prices, load_model_params
+from logging_config import get_logger
+
+# Setup logger for serving module
+logger = get_logger(__name__)
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ModelHolder:
+    """Current (θ₀, θ₁, version) snapshot, swapped atomically when the model file changes."""
+
+    def __init__(self, filename="model_params.json"):
+        self.filename = filename
+        self.params = (0, 0, 0)
+        self._signature = None
+        if not self.reload_if_changed():
+            logger.warning("No trained model found, serving default parameters (predictions will be 0)")
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload_if_changed(self):
+        """Load the model file if its mtime/size changed; returns True when new parameters were swapped in."""
+        signature = self._file_signature()
+        if signature is None or signature == self._signature:
+            return False
+
+        params = load_model_params(self.filename)
+        if not params:
+            return False
+
+        # Rebinding one tuple is atomic: a batch sees either the old or the new parameters, never a mix
+        self.params = (params["theta0"], params["theta1"], self.params[2] + 1)
+        self._signature = signature
+        logger.info(f"Model v{self.params[2]} loaded: θ₀={self.params[0]:.6f}, θ₁={self.params[1]:.6f}")
+        return True
+
+    async def watch(self, interval):
+        """Poll the model file and hot-swap parameters when it changes."""
+        while True:
+            await asyncio.sleep(interval)
+            self.reload_if_changed()
+
+
+class LatencyStats:
+    """Request counter with a ring buffer of recent latencies for percentile reporting."""
+
+    def __init__(self, capacity=65536):
+        self.latencies = np.zeros(capacity)
+        self.count = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.started = time.perf_counter()
+
+    def record(self, latency):
+        self.latencies[self.count % len(self.latencies)] = latency
+        self.count += 1
+
+    def summary(self):
+        """Requests, throughput and latency percentiles (milliseconds) over the recent window."""
+        recent = self.latencies[: min(self.count, len(self.latencies))]
+        p50, p99 = np.percentile(recent, [50, 99]) * 1000 if len(recent) else (0.0, 0.0)
+        uptime = time.perf_counter() - self.started
+        return {
+            "requests": self.count,
+            "uptime_s": round(uptime, 3),
+            "requests_per_s": round(self.count / uptime, 1) if uptime > 0 else 0.0,
+            "p50_ms": round(float(p50), 3),
+            "p99_ms": round(float(p99), 3),
+            "batches": self.batches,
+            "mean_batch_rows": round(self.batched_rows / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class MicroBatcher:
+    """Collects mileage arrays submitted concurrently and scores them together in one vectorized call."""
+
+    def __init__(self, model, stats, window=0.002, max_batch=4096):
+        self.model = model
+        self.stats = stats
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+
+    async def submit(self, mileage):
+        """Queue mileages and wait for (prices, valid, model_version)."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((mileage, future))
+        return await future
+
+    async def run(self):
+        """Batch loop: wait for a first request, let the latency window fill the batch, then score it."""
+        while True:
+            items = [await self.queue.get()]
+            if self.queue.qsize() < self.max_batch:
+                await asyncio.sleep(self.window)
+            rows = len(items[0][0])
+            while rows < self.max_batch and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+                rows += len(items[-1][0])
+
+            # Any failure is reported to this batch's requests; the loop must survive it to serve the next batch
+            try:
+                theta0, theta1, version = self.model.params
+                mileage = np.concatenate([m for m, _ in items])
+                prices, valid = estimate_prices(mileage, theta0, theta1)
+                self.stats.batches += 1
+                self.stats.batched_rows += rows
+                cuts = np.cumsum([len(m) for m, _ in items])[:-1]
+                for (_, future), batch_prices, batch_valid in zip(items, np.split(prices, cuts), np.split(valid, cuts)):
+                    if not future.done():
+                        future.set_result((batch_prices, batch_valid, version))
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} requests failed: {e}")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+
+class PredictionServer:
+    """Minimal HTTP/1.1 keep-alive server exposing /predict, /stats and /health."""
+
+    def __init__(self, model_file="model_params.json", window=0.002, max_batch=4096, reload_interval=1.0):
+        self.model = ModelHolder(model_file)
+        self.stats = LatencyStats()
+        self.batcher = MicroBatcher(self.model, self.stats, window, max_batch)
+        self.reload_interval = reload_interval
+        self._tasks = []
+
+    async def start(self, host="127.0.0.1", port=8000, unix_path=None):
+        """Start background tasks and listen on a TCP port or a Unix socket."""
+        self._tasks = [asyncio.create_task(self.batcher.run()), asyncio.create_task(self.model.watch(self.reload_interval))]
+        if unix_path:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_path)
+            logger.info(f"Serving on unix:{unix_path}")
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            logger.info(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}")
+        return server
+
+    async def stop(self, server):
+        """Close the listener and cancel background tasks."""
+        server.close()
+        await server.wait_closed()
+        for task in self._tasks:
+            task.cancel()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                started = time.perf_counter()
+                status, payload = await self._route(method, target, body)
+                if status == 200 and urlsplit(target).path == "/predict":
+                    self.stats.record(time.perf_counter() - started)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                writer.write(head.encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        """Dispatch a request; returns (status, JSON payload)."""
+        url = urlsplit(target)
+        if url.path == "/stats":
+            return 200, {**self.stats.summary(), "model_version": self.model.params[2]}
+        if url.path == "/health":
+            return 200, {"status": "ok", "model_version": self.model.params[2]}
+        if url.path != "/predict":
+            return 404, {"error": "Unknown endpoint"}
+
+        try:
+            as_list = False
+            if method == "GET":
+                values = [float(parse_qs(url.query)["km"][0])]
+            elif method == "POST":
+                km = json.loads(body)["km"]
+                as_list = isinstance(km, list)
+                values = km if as_list else [km]
+            else:
+                return 405, {"error": "Use GET or POST"}
+            mileage = np.asarray(values, dtype=np.float64)
+            if mileage.ndim != 1:
+                raise ValueError("km must be a number or a flat list of numbers")
+        except (KeyError, TypeError, ValueError):
+            return 400, {"error": "Expected km=<number> or a JSON body {\"km\": number | [numbers]}"}
+
+        try:
+            prices, valid, version = await self.batcher.submit(mileage)
+        except Exception as e:
+            return 500, {"error": str(e)}
+        if not np.all(valid):
+            return 400, {"error": "Invalid mileage value (non-finite or negative)", "invalid": np.flatnonzero(~valid).tolist()}
+
+        return 200, {"price": prices.tolist() if as_list else float(prices[0]), "model_version": version}
+
+
+async def _bench_client(open_connection, n_requests, latencies, seed):
+    """Issue sequential keep-alive GET /predict requests and record client-side latencies."""
+    reader, writer = await open_connection()
+    rng = np.random.default_rng(seed)
+    for km in rng.uniform(0, 300000, n_requests):
+        started = time.perf_counter()
+        writer.write(f"GET /predict?km={km:.0f} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        content_length = 0
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            if line.lower().startswith(b"content-length:"):
+                content_length = int(line.split(b":")[1])
+        await reader.readexactly(content_length)
+        latencies.append(time.perf_counter() - started)
+    writer.close()
+
+
+async def run_benchmark(server, n_requests=20000, concurrency=64):
+    """Load-test a server in-process over a temporary Unix socket and report client-side p50/p99 and RPS."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "predict.sock")
+        listener = await server.start(unix_path=path)
+        latencies = []
+        per_client = max(1, n_requests // concurrency)
+        started = time.perf_counter()
+        await asyncio.gather(*(_bench_client(lambda: asyncio.open_unix_connection(path), per_client, latencies, seed) for seed in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await server.stop(listener)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    summary = server.stats.summary()
+    print(f"Requests: {len(latencies)} with {concurrency} concurrent clients in {elapsed:.2f}s")
+    print(f"Throughput: {len(latencies) / elapsed:,.0f} requests/s")
+    print(f"Latency: p50 = {p50:.3f} ms, p99 = {p99:.3f} ms")
+    print(f"Micro-batches: {summary['batches']} (mean {summary['mean_batch_rows']} rows)")
+    return 0
+
+
+async def serve(args):
+    """Run the server until cancelled."""
+    server = PredictionServer(args.model, args.window_ms / 1000, args.max_batch, args.reload_interval)
+    if args.bench:
+        return await run_benchmark(server, args.bench, args.concurrency)
+
+    listener = await server.start(args.host, args.port, args.unix)
+    async with listener:
+        await listener.serve_forever()
+
+
+def parse_args(argv=None):
+    """Parse command line options for the prediction server."""
+    parser = argparse.ArgumentParser(description="Serve price predictions over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="TCP port (default: 8000)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--model", default="model_params.json", help="model file to serve and watch (default: model_params.json)")
+    parser.add_argument("--window-ms", type=float, default=2.0, help="micro-batching latency window in milliseconds (default: 2)")
+    parser.add_argument("--max-batch", type=int, default=4096, help="maximum mileages per micro-batch (default: 4096)")
+    parser.add_argument("--reload-interval", type=float, default=1.0, help="seconds between model file checks (default: 1)")
+    parser.add_argument("--bench", type=int, metavar="N", help="run an in-process load test with N requests and exit")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients for --bench (default: 64)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Main function to run the server and handle errors."""
+    args = parse_args(argv)
+    try:
+        return asyncio.run(serve(args)) or 0
+    except KeyboardInterrupt:
+        print("\nServer stopped.", file=sys.stderr)
+        return 0
+    except Exception as e:
+        logger.error(f"Server failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    exit(main())
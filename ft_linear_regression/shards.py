@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Sharded training data spread over worker processes.
+Every worker loads a fixed subset of the CSV shards once and keeps them in memory; the coordinator
+only exchanges per-shard statistics and error sums with it. Partials are always combined in shard
+order, so training gives bit-for-bit the same parameters whatever the number of workers.
+"""
+
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from csv_reader import read_csv_columns
+from reductions import FusedReducer
+from stats import SufficientStats
+from utils import load_cached_data
+from logging_config import get_logger
+
+# Setup logger for shards module
+logger = get_logger(__name__)
+
+
+def shard_paths(pattern):
+    """Files matching a glob pattern, sorted so the shard order (and the merge order) is stable."""
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise ValueError(f"No shard files match '{pattern}'")
+    return paths
+
+
+def _load_shard(path, use_cache):
+    """(mileage, price) of one shard, from its binary cache when available."""
+    from train import _validate_training_data
+
+    data = load_cached_data(path) if use_cache else None
+    if data is None:
+        data, _ = read_csv_columns(path)
+    try:
+        _validate_training_data(data[0], data[1])
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+    return data[0], data[1]
+
+
+def _serve_shards(connection, paths, use_cache):
+    """Worker loop: load the shards, send their statistics, then answer commands until None arrives.
+
+    Commands are ("normalize", (mean_x, std_x, mean_y, std_y)) and ("error_sums", (θ₀, θ₁)); replies
+    are ("ok", one result per shard) or ("error", message).
+    """
+    reducer = FusedReducer(1)
+    try:
+        shards = [_load_shard(path, use_cache) for path in paths]
+        connection.send(("ok", [SufficientStats().update(x, y) for x, y in shards]))
+        while (message := connection.recv()) is not None:
+            command, args = message
+            if command == "normalize":
+                mean_x, std_x, mean_y, std_y = args
+                shards = [((x - mean_x) / std_x, (y - mean_y) / std_y) for x, y in shards]
+                connection.send(("ok", None))
+            elif command == "error_sums":
+                connection.send(("ok", [reducer.error_sums(x, y, *args) for x, y in shards]))
+            else:
+                connection.send(("error", f"Unknown command '{command}'"))
+    except Exception as e:
+        # Reported to the coordinator instead of leaving it waiting on the pipe
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+class ShardedDataset:
+    """CSV shards loaded by worker processes that answer statistics and error-sum requests.
+
+    Shard i is owned by worker i % workers for the whole run, so data is loaded once and never sent
+    over the pipes. Use it as a context manager (or call close()) to stop the workers.
+    """
+
+    def __init__(self, paths, workers=None, use_cache=True):
+        self.paths = list(paths)
+        if not self.paths:
+            raise ValueError("No shard files")
+        self.workers = min(workers or os.cpu_count() or 1, len(self.paths))
+        self._owned = [range(w, len(self.paths), self.workers) for w in range(self.workers)]
+        self._connections, self._processes = [], []
+
+        for w, owned in enumerate(self._owned):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shards, args=(child, [self.paths[i] for i in owned], use_cache), name=f"shard-worker-{w}")
+            process.start()
+            child.close()
+            self._connections.append(parent)
+            self._processes.append(process)
+
+        logger.debug(f"{len(self.paths)} shards on {self.workers} worker processes")
+        self.shard_stats = self._collect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _collect(self):
+        """Replies of every worker, rearranged as one result per shard in shard order."""
+        results, failure = [None] * len(self.paths), None
+        for owned, connection in zip(self._owned, self._connections):
+            status, payload = connection.recv()
+            if status == "error":
+                failure = failure or payload
+            elif payload is not None:
+                for i, result in zip(owned, payload):
+                    results[i] = result
+        if failure:
+            self.close()
+            raise ValueError(f"Shard worker failed: {failure}")
+        return results
+
+    def _request(self, command, args):
+        for connection in self._connections:
+            connection.send((command, args))
+        return self._collect()
+
+    def stats(self):
+        """SufficientStats of all shards, merged in shard order."""
+        total = SufficientStats()
+        for shard in self.shard_stats:
+            total.merge(shard)
+        return total
+
+    def normalize(self, mean_x, std_x, mean_y, std_y):
+        """Standardize every shard in place on its worker (once, before gradient descent)."""
+        self._request("normalize", (mean_x, std_x, mean_y, std_y))
+
+    def error_sums(self, theta0, theta1):
+        """[Σerr, Σerr·x, Σerr²] over all shards: one parallel pass, partials summed in shard order."""
+        return np.array(self._request("error_sums", (theta0, theta1))).sum(axis=0)
+
+    def close(self):
+        """Stop and join the worker processes."""
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+
+def compare_workers(pattern, max_workers=os.cpu_count(), n_iterations=100):
+    """Print load time and time per gradient descent pass for 1..max_workers processes, and check the results match."""
+    from train import LinearRegression
+
+    paths = shard_paths(pattern)
+    counts = sorted({1, 2, 4, 8, 16, 32, 64, max_workers} & set(range(1, max_workers + 1)))
+    print(f"{len(paths)} shards, {n_iterations} iterations")
+    reference, baseline = None, None
+    for count in counts:
+        start = time.perf_counter()
+        with ShardedDataset(paths, workers=count) as shards:
+            loaded = time.perf_counter()
+            model = LinearRegression(learning_rate=0.5, n_iterations=n_iterations, tol=None).fit_sharded(shards, verbose=False)
+            per_pass = (time.perf_counter() - loaded) / model.n_passes
+        params = (model.theta0_final, model.theta1_final)
+        reference = reference or params
+        baseline = baseline or per_pass
+        print(f"  {count:>3} workers  load {loaded - start:7.3f}s  {per_pass * 1000:8.2f} ms/pass  {baseline / per_pass:5.2f}x  identical: {params == reference}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print('Usage: python shards.py "shards/*.csv" [MAX_WORKERS]')
+        exit(1)
+    compare_workers(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count())
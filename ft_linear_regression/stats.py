@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Running sufficient statistics for simple linear regression.
+Accumulates count, means and co-moments of (x, y) chunk by chunk with numerically stable merges.
+"""
+
+import numpy as np
+
+# Rows of float32 input widened to float64 at a time, so no full-size float64 copy is made
+WIDEN_BLOCK = 1 << 16
+
+
+class SufficientStats:
+    """Mergeable n, x̄, ȳ, Σ(x-x̄)², Σ(y-ȳ)² and Σ(x-x̄)(y-ȳ) using Welford/Chan co-moment updates."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def update(self, x, y, weights=None):
+        """Add a chunk of samples; the chunk is centered on its own means before merging.
+
+        weights (e.g. duplicate counts) count each sample that many times; n is then the sum of the weights.
+        float32 chunks are accumulated in float64, WIDEN_BLOCK rows at a time.
+        """
+        if len(x) > WIDEN_BLOCK and np.float32 in (np.asarray(x).dtype, np.asarray(y).dtype):
+            for start in range(0, len(x), WIDEN_BLOCK):
+                block = slice(start, start + WIDEN_BLOCK)
+                self.update(x[block], y[block], None if weights is None else weights[block])
+            return self
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if len(x) == 0:
+            return self
+
+        chunk = SufficientStats()
+        if weights is None:
+            chunk.n = len(x)
+            chunk.mean_x, chunk.mean_y = np.mean(x), np.mean(y)
+            dx, dy = x - chunk.mean_x, y - chunk.mean_y
+            chunk.m2_x, chunk.m2_y, chunk.c_xy = np.dot(dx, dx), np.dot(dy, dy), np.dot(dx, dy)
+        else:
+            weights = np.asarray(weights, dtype=float)
+            chunk.n = weights.sum()
+            chunk.mean_x, chunk.mean_y = np.dot(weights, x) / chunk.n, np.dot(weights, y) / chunk.n
+            dx, dy = x - chunk.mean_x, y - chunk.mean_y
+            weighted_dx = weights * dx
+            chunk.m2_x, chunk.m2_y, chunk.c_xy = np.dot(weighted_dx, dx), np.dot(weights * dy, dy), np.dot(weighted_dx, dy)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        """Combine another accumulator into this one (parallel co-moment formula)."""
+        if other.n == 0:
+            return self
+
+        n = self.n + other.n
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+
+        self.mean_x += delta_x * other.n / n
+        self.mean_y += delta_y * other.n / n
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.n = n
+        return self
+
+    def to_dict(self):
+        """Plain-float state for JSON persistence (floats round-trip exactly); a weighted n stays a float unless integral."""
+        n = float(self.n)
+        return {"n": int(n) if n.is_integer() else n, "mean_x": float(self.mean_x), "mean_y": float(self.mean_y), "m2_x": float(self.m2_x), "m2_y": float(self.m2_y), "c_xy": float(self.c_xy)}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild an accumulator saved with to_dict."""
+        stats = cls()
+        stats.n = state["n"] if isinstance(state["n"], int) else float(state["n"])
+        stats.mean_x, stats.mean_y = float(state["mean_x"]), float(state["mean_y"])
+        stats.m2_x, stats.m2_y, stats.c_xy = float(state["m2_x"]), float(state["m2_y"]), float(state["c_xy"])
+        return stats
+
+    @property
+    def std_x(self):
+        """Population standard deviation of x."""
+        return np.sqrt(self.m2_x / self.n) if self.n else 0.0
+
+    @property
+    def std_y(self):
+        """Population standard deviation of y."""
+        return np.sqrt(self.m2_y / self.n) if self.n else 0.0
+
+    def solve(self):
+        """Return the least-squares (θ₀, θ₁); θ₁ is 0 when x is constant."""
+        if self.n == 0:
+            raise ValueError("No samples accumulated")
+        theta1 = self.c_xy / self.m2_x if self.m2_x > 0 else 0.0
+        theta0 = self.mean_y - theta1 * self.mean_x
+        return theta0, theta1
+
+    def residual_sum_of_squares(self):
+        """Σ(y - ŷ)² of the least-squares fit."""
+        if self.m2_x <= 0:
+            return self.m2_y
+        return max(self.m2_y - self.c_xy * self.c_xy / self.m2_x, 0.0)
@@ -0,0 +1,28 @@
+"""Regression tests of batch prediction input parsing (run by make test)."""
+
+import numpy as np
+from model_store import write_model_store
+from predict import _parse_block, iter_mileage_chunks, predict_batch
+
+
+def test_ragged_rows_are_not_shifted(tmp_path):
+    """Ragged lines whose field total matches a rectangular block keep their own first field."""
+    source = tmp_path / "queries.csv"
+    source.write_bytes(b"1,2\n3,4,5\n6\n")
+    mileage = np.concatenate(list(iter_mileage_chunks(str(source))))
+    np.testing.assert_array_equal(mileage, [1, 3, 6])
+
+
+def test_blocks_give_one_row_per_line():
+    """CRLF endings and empty fields still give one row per line."""
+    np.testing.assert_array_equal(_parse_block(b"1,2\r\n3,4\r\n", 2), [[1, 2], [3, 4]])
+    np.testing.assert_array_equal(_parse_block(b"1,,2\n3,4,5\n", 1)[:, 0], [1, 3])
+
+
+def test_store_ragged_rows_are_not_shifted(tmp_path):
+    """A store row without an id is written as NaN instead of borrowing the id of the line above."""
+    store, source, output = tmp_path / "models.npy", tmp_path / "queries.csv", tmp_path / "prices.csv"
+    write_model_store(str(store), np.array([5, 17]), np.array([9000.0, 9500.0]), np.array([-0.02, -0.0095]))
+    source.write_bytes(b"17,1000\n5,2000,17\n3000\n")
+    assert predict_batch(str(source), str(output), store=str(store)) == 0
+    assert output.read_bytes() == b"id,km,price\n17,1000,9490.50\n5,2000,8960.00\nnan,nan,nan\n"
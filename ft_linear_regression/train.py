@@ -4,10 +4,23 @@ Linear regression with automatic hyperparameter optimization.
 Implements the formula: estimatePrice(mileage) = θ₀ + (θ₁ * mileage)
 """
 
+import argparse
 import json
-import matplotlib.pyplot as plt
+import os
 import numpy as np
-from utils import load_data
+from checkpoint import checkpoint_path, load_checkpoint, save_checkpoint
+from csv_reader import count_lines, whole_lines_end
+from cross_validation import select_learning_rate
+from metrics import RegressionMetrics
+from plotting import add_plot_arguments, get_pyplot, render, scatter
+from optimizers import LINE_SEARCHES, OPTIMIZERS, decayed_learning_rate, make_optimizer, quadratic_hessian
+from reductions import FusedReducer
+from segments import SEGMENT_MODELS_FILE, SegmentedRegression
+from shards import ShardedDataset, shard_paths
+from stats import SufficientStats
+from training_cache import TrainingCache
+from training_trace import TrainingTrace, default_sampling, denormalize, sampling_mask
+from utils import DTYPES, iter_data_chunks, load_cached_data, load_data
 from logging_config import get_logger
 
 # Setup logger for training module
@@ -20,13 +33,47 @@ class ManualScaler:
     def __init__(self):
         self.mean_ = None
         self.std_ = None
-
-    def fit_transform(self, X):
-        """Fit the scaler and transform the data."""
-        self.mean_ = np.mean(X)
-        self.std_ = np.std(X)
+        self.n_samples_ = 0
+        self._m2 = 0.0
+
+    def fit_transform(self, X, weights=None):
+        """Fit the scaler (weighted mean and std when weights are given) and transform the data.
+
+        float32 data stays float32 (compact mode); the mean and std are always accumulated in float64.
+        """
+        X = np.asarray(X)
+        dtype = np.float32 if X.dtype == np.float32 else np.float64
+        self.mean_ = np.mean(X, dtype=np.float64) if weights is None else np.average(X, weights=weights)
+        centered = X - dtype(self.mean_)
+        squares = np.square(centered)
+        self.std_ = np.sqrt(np.mean(squares, dtype=np.float64) if weights is None else np.average(squares, weights=weights))
+        if self.std_ == 0:
+            self.std_ = 1
+        centered /= dtype(self.std_)
+        return centered
+
+    def partial_fit(self, X):
+        """Update mean and std with a new chunk using the parallel (Chan) variance merge."""
+        n_chunk = len(X)
+        if n_chunk == 0:
+            return self
+
+        chunk_mean = np.mean(X)
+        chunk_m2 = np.sum((X - chunk_mean) ** 2)
+        n_total = self.n_samples_ + n_chunk
+        mean = self.mean_ if self.n_samples_ else 0.0
+        delta = chunk_mean - mean
+
+        self.mean_ = mean + delta * n_chunk / n_total
+        self._m2 += chunk_m2 + delta**2 * self.n_samples_ * n_chunk / n_total
+        self.n_samples_ = n_total
+        self.std_ = np.sqrt(self._m2 / n_total)
         if self.std_ == 0:
             self.std_ = 1
+        return self
+
+    def transform(self, X):
+        """Transform data with the already fitted mean and std."""
         return (X - self.mean_) / self.std_
 
     def inverse_transform(self, X):
@@ -34,11 +81,31 @@ class ManualScaler:
         return X * self.std_ + self.mean_
 
 
+SOLVERS = ("gd", "exact")
+
+
 class LinearRegression:
     """Linear regression model using gradient descent with normalization."""
 
-    def __init__(self, learning_rate=0.5, n_iterations=1000):
-        """Initialize the model with hyperparameters."""
+    def __init__(self, learning_rate=0.5, n_iterations=1000, solver="gd", sampling=default_sampling, optimizer="gd", tol=1e-6, rtol=None, gtol=None, normalize=True, batch_size=None, lr_decay=0.0, seed=0, workers=None):
+        """Initialize the model with hyperparameters.
+
+        solver="gd" runs the iterative `optimizer` (see optimizers.OPTIMIZERS); solver="exact" solves
+        least squares from one pass of sufficient statistics and ignores the learning rate.
+        `sampling(i)` decides which iterations keep their parameters in the training trace.
+        Training stops when the cost changes by less than tol (absolute) or rtol (relative), or when
+        the gradient norm drops to gtol; None disables a criterion. normalize=False trains on the raw
+        mileage and price (ill-conditioned, mainly for comparing optimizers).
+        With batch_size, every iteration is an epoch of mini-batch steps over a shuffled index order
+        (seeded by seed) with the step size decayed as learning_rate / (1 + lr_decay * epoch).
+        Error sums are reduced in cache-sized chunks on `workers` threads (default: all cores).
+        """
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver '{solver}' (expected one of {', '.join(SOLVERS)})")
+        if optimizer not in OPTIMIZERS:
+            raise ValueError(f"Unknown optimizer '{optimizer}' (expected one of {', '.join(OPTIMIZERS)})")
+        if batch_size is not None and (batch_size < 1 or optimizer in LINE_SEARCHES):
+            raise ValueError("batch_size must be positive and cannot be combined with a line search optimizer")
         if learning_rate <= 0:
             raise ValueError("Learning rate must be positive")
         if learning_rate > 1.0:
@@ -46,107 +113,390 @@ class LinearRegression:
 
         self.learning_rate = learning_rate
         self.n_iterations = n_iterations
+        self.solver = solver
+        self.optimizer = optimizer
+        self.tol, self.rtol, self.gtol = tol, rtol, gtol
+        self.normalize = normalize
+        self.batch_size, self.lr_decay, self.seed = batch_size, lr_decay, seed
+        self.converged = False
+        self.n_passes = 0
         self.theta0 = self.theta1 = 0.0
         self.scaler_x = ManualScaler()
         self.scaler_y = ManualScaler()
-        self.cost_history = []
-        self.theta_history = []
+        self.trace = TrainingTrace(n_iterations, sampling)
+        self.stats = SufficientStats()
+        self._reducer = FusedReducer(workers)
 
-    def _normalize_data(self, X, y):
+    @property
+    def cost_history(self):
+        """Cost per iteration (array view of the training trace)."""
+        return self.trace.costs
+
+    @property
+    def theta_history(self):
+        """Sampled (iteration, θ₀, θ₁) tuples on the original scale."""
+        return self.trace.history()
+
+    def _normalize_data(self, X, y, weights=None):
         """Normalize input data using ManualScaler for numerical stability."""
-        X_norm = self.scaler_x.fit_transform(X)
-        y_norm = self.scaler_y.fit_transform(y)
+        X_norm = self.scaler_x.fit_transform(X, weights)
+        y_norm = self.scaler_y.fit_transform(y, weights)
+        if not self.normalize:
+            self._disable_scaling()
+            return np.asarray(X, dtype=float), np.asarray(y, dtype=float)
         return X_norm, y_norm
 
+    def _disable_scaling(self):
+        """Make both scalers the identity (normalize=False)."""
+        for scaler in (self.scaler_x, self.scaler_y):
+            scaler.mean_, scaler.std_ = 0.0, 1.0
+
+    def _scale(self):
+        """(mean_x, std_x, mean_y, std_y) of the fitted scalers."""
+        return self.scaler_x.mean_, self.scaler_x.std_, self.scaler_y.mean_, self.scaler_y.std_
+
     def _denormalize_parameters(self):
         """Convert normalized parameters back to original scale."""
-        dummy_mileage = np.array([[0], [1]])
-        dummy_price = np.array([[self.theta0], [self.theta0 + self.theta1]])
-        original_mileage = self.scaler_x.inverse_transform(dummy_mileage)
-        original_price = self.scaler_y.inverse_transform(dummy_price)
-        theta1_final = (original_price[1][0] - original_price[0][0]) / (original_mileage[1][0] - original_mileage[0][0])
-        theta0_final = original_price[0][0] - theta1_final * original_mileage[0][0]
-        return theta0_final, theta1_final
+        return denormalize(self.theta0, self.theta1, *self._scale())
 
     def predict(self, X):
         """Make predictions using current parameters (for normalized data)."""
         return self.theta0 + (self.theta1 * X)
 
-    def fit(self, X, y, verbose=True):
-        """Train the model using gradient descent with automatic convergence detection."""
-        X_norm, y_norm = self._normalize_data(X, y)
-        m = len(X)
+    def _error_sums(self, X_norm, y_norm, weights=None):
+        """Return Σ(errors), Σ(errors * x) and Σ(errors²) for the current parameters (one fused pass)."""
+        return self._reducer.error_sums(X_norm, y_norm, self.theta0, self.theta1, weights)
+
+    def fit(self, X, y, verbose=True, sample_weight=None):
+        """Train the model using gradient descent with automatic convergence detection.
+
+        sample_weight (e.g. duplicate counts from compression.compress_samples) counts each row that many
+        times in the scalers, the gradient sums and the exact solution, so compressed rows train like the
+        raw ones. It is not supported with mini-batch SGD.
+        """
+        try:
+            return self._fit(X, y, verbose, sample_weight)
+        finally:
+            self._reducer.close()
+
+    def _fit(self, X, y, verbose, weights=None):
+        if self.solver == "exact":
+            return self._fit_exact(SufficientStats().update(X, y, weights), verbose)
+        if weights is not None and self.batch_size:
+            raise ValueError("Sample weights are not supported with mini-batch SGD")
+
+        X_norm, y_norm = self._normalize_data(X, y, weights)
+        m = len(X) if weights is None else np.sum(weights)
         if verbose:
-            logger.info(f"Training on {m} samples...")
+            logger.info(f"Training on {m:g} samples{f' ({len(X)} distinct rows)' if weights is not None else ''}...")
 
-        prev_cost, tolerance = float("inf"), 1e-6
+        if self.batch_size:
 
-        for i in range(self.n_iterations):
-            predictions = self.predict(X_norm)
-            errors = predictions - y_norm
+            def epoch_batches(rng):
+                # One permutation of indices per epoch; only the current batch is gathered
+                order = rng.permutation(m)
+                for start in range(0, m, self.batch_size):
+                    batch = order[start : start + self.batch_size]
+                    yield X_norm[batch], y_norm[batch]
+
+            return self._minibatch_descent(epoch_batches, m, verbose)
+
+        if weights is None:
+            hessian = quadratic_hessian(np.mean(X_norm), np.dot(X_norm, X_norm) / m)
+        else:
+            hessian = quadratic_hessian(np.dot(weights, X_norm) / m, np.dot(weights * X_norm, X_norm) / m)
+        return self._gradient_descent(lambda: self._error_sums(X_norm, y_norm, weights), m, verbose, hessian)
 
-            # Gradient descent formulas: tmp_θ = learningRate * (1/m) * Σ(errors)
-            # np.mean() computes (1/m) * Σ automatically
-            tmp_theta0 = self.learning_rate * np.mean(errors)
-            tmp_theta1 = self.learning_rate * np.mean(errors * X_norm)
-            max_gradient = 1e6
-            tmp_theta0 = np.clip(tmp_theta0, -max_gradient, max_gradient)
-            tmp_theta1 = np.clip(tmp_theta1, -max_gradient, max_gradient)
+    def fit_stream(self, chunks, verbose=True):
+        """Train with gradient descent over a re-iterable chunk source so memory depends on chunk size only.
+
+        `chunks` is a callable returning a fresh iterable of (X, y) chunks; it is called once to fit
+        the scalers and once per epoch (a single time with the exact solver).
+        """
+        try:
+            return self._fit_stream(chunks, verbose)
+        finally:
+            self._reducer.close()
+
+    def _fit_stream(self, chunks, verbose):
+        if self.solver == "exact":
+            stats = SufficientStats()
+            for X, y in chunks():
+                stats.update(X, y)
+            return self._fit_exact(stats, verbose)
+
+        for X, y in chunks():
+            self.scaler_x.partial_fit(X)
+            self.scaler_y.partial_fit(y)
+
+        m = self.scaler_x.n_samples_
+        if m == 0:
+            raise ValueError("No training data")
+        if verbose:
+            logger.info(f"Streaming training on {m} samples...")
+
+        # E[x] and E[x²] in training coordinates, from the accumulated moments
+        mean_x, var_x = self.scaler_x.mean_, self.scaler_x._m2 / m
+        if not self.normalize:
+            self._disable_scaling()
+
+        if self.batch_size:
+
+            def epoch_batches(rng):
+                # Chunks arrive in file order; rows are shuffled within each chunk through an index permutation
+                for X, y in chunks():
+                    X_norm, y_norm = self.scaler_x.transform(X), self.scaler_y.transform(y)
+                    order = rng.permutation(len(X_norm))
+                    for start in range(0, len(order), self.batch_size):
+                        batch = order[start : start + self.batch_size]
+                        yield X_norm[batch], y_norm[batch]
+
+            return self._minibatch_descent(epoch_batches, m, verbose)
+
+        shift = (mean_x - self.scaler_x.mean_) / self.scaler_x.std_
+        hessian = quadratic_hessian(shift, var_x / self.scaler_x.std_**2 + shift * shift)
+
+        def epoch_sums():
+            sums = np.zeros(3)
+            for X, y in chunks():
+                sums += self._error_sums(self.scaler_x.transform(X), self.scaler_y.transform(y))
+            return sums
+
+        return self._gradient_descent(epoch_sums, m, verbose, hessian)
+
+    def partial_fit(self, X, y, verbose=True):
+        """Add samples to the running sufficient statistics (self.stats) and re-solve θ₀/θ₁ in closed form.
+
+        Each call takes time proportional to len(X): earlier samples only survive as statistics, and
+        the least-squares solution is what gradient descent converges to, whatever the solver.
+        """
+        self.stats.update(X, y)
+        if self.stats.n < 2:
+            return self
+        return self._fit_exact(self.stats, verbose)
+
+    def fit_sharded(self, shards, verbose=True):
+        """Train on a shards.ShardedDataset; per-shard statistics and error sums are merged in shard order.
+
+        Every gradient descent pass is one parallel pass over the workers' shards, and the parameters
+        are bit-for-bit the same for any number of workers. Mini-batch SGD is not supported.
+        """
+        if self.batch_size:
+            raise ValueError("Mini-batch SGD is not supported for sharded training")
+        stats = shards.stats()
+        if self.solver == "exact":
+            return self._fit_exact(stats, verbose)
+        if stats.n == 0:
+            raise ValueError("No training data")
+        if verbose:
+            logger.info(f"Sharded training on {stats.n} samples from {len(shards.paths)} shards ({shards.workers} workers)...")
+
+        self._fit_scalers(stats)
+        if not self.normalize:
+            self._disable_scaling()
+        shards.normalize(*self._scale())
+
+        shift = (stats.mean_x - self.scaler_x.mean_) / self.scaler_x.std_
+        hessian = quadratic_hessian(shift, stats.m2_x / stats.n / self.scaler_x.std_**2 + shift * shift)
+        return self._gradient_descent(lambda: shards.error_sums(self.theta0, self.theta1), stats.n, verbose, hessian)
+
+    def _fit_scalers(self, stats):
+        """Set both scalers from accumulated sufficient statistics."""
+        for scaler, mean, std, m2 in ((self.scaler_x, stats.mean_x, stats.std_x, stats.m2_x), (self.scaler_y, stats.mean_y, stats.std_y, stats.m2_y)):
+            scaler.mean_, scaler.std_, scaler.n_samples_, scaler._m2 = mean, std if std != 0 else 1, stats.n, m2
+
+    def _fit_exact(self, stats, verbose):
+        """Set the parameters from accumulated sufficient statistics (closed-form least squares)."""
+        if stats.n < 2:
+            raise ValueError("Insufficient data for training")
+        if verbose:
+            logger.info(f"Solving exactly from sufficient statistics of {stats.n} samples...")
+
+        self._fit_scalers(stats)
+
+        # In normalized space both variables are centered, so the intercept is 0
+        self.theta0_final, self.theta1_final = stats.solve()
+        self.theta0 = 0.0
+        self.theta1 = self.theta1_final * self.scaler_x.std_ / self.scaler_y.std_
+
+        self.trace.scale = self._scale()
+        self.trace.record(stats.residual_sum_of_squares() / self.scaler_y.std_**2 / stats.n / 2, self.theta0, self.theta1)
+        self.trace.finish(self.theta0, self.theta1)
+        return self
 
-            self.theta0 -= tmp_theta0
-            self.theta1 -= tmp_theta1
+    def _cost_converged(self, prev_cost, cost):
+        """Absolute (tol) or relative (rtol) cost change below its tolerance; None disables a criterion."""
+        change = abs(prev_cost - cost)
+        if self.tol is not None and change < self.tol:
+            return True
+        return self.rtol is not None and np.isfinite(prev_cost) and change <= self.rtol * abs(prev_cost)
+
+    def _stop(self, i, verbose, unit="iterations"):
+        self.converged = True
+        if verbose:
+            logger.info(f"Converged after {i + 1} {unit} ({self.optimizer}, {self.n_passes} data passes)")
+
+    def _minibatch_descent(self, epoch_batches, m, verbose):
+        """Mini-batch SGD: each iteration is one epoch of optimizer steps on batch gradients.
+
+        epoch_batches(rng) yields the normalized (X, y) batches of one shuffled epoch. The epoch cost
+        recorded in the trace, and used for the convergence tests, is the mean of the batch costs
+        measured just before each batch's step. The gradient-norm test uses the epoch's summed batch gradients.
+        """
+        optimizer = make_optimizer(self.optimizer, self.learning_rate, None)
+        rng = np.random.default_rng(self.seed)
+        prev_cost = float("inf")
+        trace = self.trace
+        trace.scale = self._scale()
+        theta = np.array([self.theta0, self.theta1], dtype=float)
+        self.converged = False
+        self.n_passes = 0
+
+        for epoch in range(self.n_iterations):
+            optimizer.learning_rate = decayed_learning_rate(self.learning_rate, self.lr_decay, epoch)
+            epoch_sums = np.zeros(3)
+            for X_batch, y_batch in epoch_batches(rng):
+                sums = self._error_sums(X_batch, y_batch)
+                epoch_sums += sums
+                theta, _ = optimizer.step(theta, sums[:2] / len(X_batch), sums[2] / len(X_batch) / 2, None)
+                self.theta0, self.theta1 = theta
+            self.n_passes += 1
 
             if not (np.isfinite(self.theta0) and np.isfinite(self.theta1)):
                 if verbose:
                     logger.error(f"Divergence detected - LR too high: {self.learning_rate}")
                 raise ValueError("Numerical divergence")
 
-            cost = np.mean(errors**2) / 2
+            cost = epoch_sums[2] / m / 2
             if not np.isfinite(cost):
                 logger.error("Infinite cost detected during training")
                 raise ValueError("Infinite cost")
 
-            self.cost_history.append(cost)
+            trace.record(cost, self.theta0, self.theta1)
 
-            should_store = i == 0 or (i < 10 and i % 2 == 0) or (i < 50 and i % 5 == 0) or (i < 200 and i % 20 == 0) or (i % 50 == 0)
+            gradient = epoch_sums[:2] / m
+            if self._cost_converged(prev_cost, cost) or (self.gtol is not None and np.hypot(gradient[0], gradient[1]) <= self.gtol):
+                self._stop(epoch, verbose, unit="epochs")
+                break
+            prev_cost = cost
+        else:
+            if verbose:
+                logger.info(f"Training completed: {self.n_iterations} epochs")
 
-            if should_store:
-                current_theta0, current_theta1 = self._denormalize_parameters()
-                self.theta_history.append((i, current_theta0, current_theta1))
+        self.theta0_final, self.theta1_final = self._denormalize_parameters()
+        trace.finish(self.theta0, self.theta1)
+        return self
 
-            if abs(prev_cost - cost) < tolerance:
+    def _gradient_descent(self, error_sums, m, verbose, hessian):
+        """Run the optimizer loop; error_sums() returns the epoch sums for the current parameters.
+
+        The optimizer maps (θ, ∇J, J) to the next θ. Line searches call evaluate() for trial points,
+        one data pass each, and hand back the accepted point's gradient and cost for reuse.
+        """
+        optimizer = make_optimizer(self.optimizer, self.learning_rate, hessian)
+        prev_cost = float("inf")
+        trace = self.trace
+        trace.scale = self._scale()
+        theta = np.array([self.theta0, self.theta1], dtype=float)
+        self.converged = False
+        self.n_passes = 0
+
+        def evaluate(candidate):
+            # Gradient descent formulas: ∂J/∂θ₀ = (1/m) * Σ(errors), ∂J/∂θ₁ = (1/m) * Σ(errors * x)
+            self.theta0, self.theta1 = candidate
+            self.n_passes += 1
+            sum_errors, sum_errors_x, sum_squared_errors = error_sums()
+            return np.array([sum_errors / m, sum_errors_x / m]), sum_squared_errors / m / 2
+
+        evaluation = None
+        for i in range(self.n_iterations):
+            gradient, cost = evaluation or evaluate(theta)
+
+            # Gradient-norm test before stepping: momentum methods would otherwise move on from a stationary point
+            if self.gtol is not None and np.hypot(gradient[0], gradient[1]) <= self.gtol and np.isfinite(cost):
+                trace.record(cost, self.theta0, self.theta1)
+                self._stop(i, verbose)
+                break
+
+            theta, evaluation = optimizer.step(theta, gradient, cost, evaluate)
+            self.theta0, self.theta1 = theta
+
+            if not (np.isfinite(self.theta0) and np.isfinite(self.theta1)):
                 if verbose:
-                    logger.info(f"Converged after {i + 1} iterations")
+                    logger.error(f"Divergence detected - LR too high: {self.learning_rate}")
+                raise ValueError("Numerical divergence")
+
+            if not np.isfinite(cost):
+                logger.error("Infinite cost detected during training")
+                raise ValueError("Infinite cost")
+
+            trace.record(cost, self.theta0, self.theta1)
+
+            if self._cost_converged(prev_cost, cost):
+                self._stop(i, verbose)
                 break
             prev_cost = cost
         else:
-            logger.info(f"Training completed: {self.n_iterations} iterations")
+            if verbose:
+                logger.info(f"Training completed: {self.n_iterations} iterations")
 
         self.theta0_final, self.theta1_final = self._denormalize_parameters()
-
-        final_iteration = len(self.cost_history) - 1
-        if not self.theta_history or self.theta_history[-1][0] != final_iteration:
-            self.theta_history.append((final_iteration, self.theta0_final, self.theta1_final))
-
+        trace.finish(self.theta0, self.theta1)
         return self
 
+    def to_state(self):
+        """Hyperparameters, fitted parameters and training trace as a dict of arrays (see from_state)."""
+        costs, iterations, theta0, theta1, scale = self.trace.to_arrays()
+        return {
+            "config": np.array([self.solver, self.optimizer]),
+            "hyperparameters": np.array([self.learning_rate, self.n_iterations]),
+            "parameters": np.array([self.theta0, self.theta1, self.theta0_final, self.theta1_final]),
+            "progress": np.array([self.converged, self.n_passes]),
+            "costs": costs,
+            "samples": np.vstack([iterations, theta0, theta1]),
+            "scale": scale,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a fitted model from to_state() output (scalers, parameters and trace)."""
+        solver, optimizer = (str(value) for value in state["config"])
+        learning_rate, n_iterations = state["hyperparameters"]
+        model = cls(learning_rate=float(learning_rate), n_iterations=int(n_iterations), solver=solver, optimizer=optimizer)
+        model.theta0, model.theta1, model.theta0_final, model.theta1_final = (float(value) for value in state["parameters"])
+        model.converged, model.n_passes = bool(state["progress"][0]), int(state["progress"][1])
+        scale = [float(value) for value in state["scale"]]
+        model.scaler_x.mean_, model.scaler_x.std_, model.scaler_y.mean_, model.scaler_y.std_ = scale
+        model.trace = TrainingTrace.from_arrays(state["costs"], *state["samples"], scale)
+        return model
+
     def predict_price(self, mileage):
         """Predict price for given mileage using trained model (original scale)."""
         return self.theta0_final + (self.theta1_final * mileage)
 
     def save_model(self, filename="model_params.json"):
-        """Save trained model parameters to JSON file."""
+        """Save trained model parameters to JSON file (written to a temporary file, then atomically renamed)."""
         params = {"theta0": float(self.theta0_final), "theta1": float(self.theta1_final)}
-        with open(filename, "w") as f:
+        tmp_filename = f"{filename}.tmp"
+        with open(tmp_filename, "w") as f:
             json.dump(params, f, indent=2)
+        os.replace(tmp_filename, filename)
         logger.info(f"Model saved to {filename}")
 
-    def plot_results(self, X, y):
-        """Plot training results: regression line, cost convergence, and training evolution."""
+    def plot_results(self, X, y, save_path=None, background=False, all_points=False):
+        """Plot training results: regression line, cost convergence, and training evolution.
+
+        The figure is shown, or saved headless to save_path; background renders it in a separate process.
+        Large datasets are drawn as density maps unless all_points is set.
+        """
+        render(self._draw_results, X, y, all_points, save_path=save_path, background=background)
+
+    def _draw_results(self, X, y, all_points=False):
+        plt = get_pyplot()
         plt.figure(figsize=(20, 6))
 
         plt.subplot(1, 3, 1)
-        plt.scatter(X, y, color="blue", label="Training Data", alpha=0.6)
+        scatter(X, y, all_points, color="blue", label="Training Data", alpha=0.6)
         line_x = np.linspace(np.min(X), np.max(X), 100)
         plt.plot(line_x, self.predict_price(line_x), color="red", label="Linear regression", linewidth=2)
         plt.xlabel("Mileage (km)")
@@ -164,7 +514,7 @@ class LinearRegression:
         plt.yscale("log")
 
         plt.subplot(1, 3, 3)
-        plt.scatter(X, y, color="blue", alpha=0.6, s=30, label="Training Data", zorder=5)
+        scatter(X, y, all_points, color="blue", alpha=0.6, s=30, label="Training Data", zorder=5)
 
         colors = plt.cm.viridis(np.linspace(0, 1, len(self.theta_history)))
 
@@ -201,74 +551,473 @@ class LinearRegression:
         plt.grid(True, alpha=0.3)
 
         plt.tight_layout()
-        plt.show()
 
 
-def calculate_metrics(model, mileage, price):
-    """Calculate R² and MSE manually."""
-    predictions = np.array([model.predict_price(x) for x in mileage])
+# Elements of one (candidates, rows) block of errors in BatchedLinearRegression (2 MB as float64)
+BATCH_BLOCK_ELEMENTS = 1 << 18
 
-    mse = np.mean((price - predictions) ** 2)
 
-    ss_total = np.sum((price - np.mean(price)) ** 2)
-    ss_residual = np.sum((price - predictions) ** 2)
-    r_squared = 1 - (ss_residual / ss_total) if ss_total != 0 else 0
+class BatchedLinearRegression:
+    """Gradient descent on one (θ₀, θ₁) pair per learning rate, all updated together over shared normalized data.
 
-    return r_squared, mse, len(model.cost_history)
+    Candidates that diverge or converge are masked out and stop updating; the others keep going.
+    Every iteration reduces the data in row blocks of BATCH_BLOCK_ELEMENTS (candidates × rows) with two
+    reused buffers, so memory does not grow with the number of rows times the number of candidates.
+    """
 
+    def __init__(self, learning_rates, n_iterations=1000, sampling=default_sampling):
+        """Initialize one candidate per learning rate; `sampling(i)` picks the iterations whose parameters are kept."""
+        self.learning_rates = np.asarray(learning_rates, dtype=float)
+        if self.learning_rates.ndim != 1 or len(self.learning_rates) == 0:
+            raise ValueError("At least one learning rate is required")
+        if np.any(self.learning_rates <= 0):
+            raise ValueError("Learning rate must be positive")
 
-def optimize_hyperparameters(mileage, price):
-    """Find optimal learning rate through grid search."""
-    learning_rates = [0.001, 0.01, 0.05, 0.1, 0.2, 0.5]
-    logger.info("Optimizing hyperparameters...")
+        k = len(self.learning_rates)
+        self.n_iterations = n_iterations
+        self.theta0 = np.zeros(k)
+        self.theta1 = np.zeros(k)
+        self.active = np.ones(k, dtype=bool)
+        self.converged = np.zeros(k, dtype=bool)
+        self.diverged = np.zeros(k, dtype=bool)
+        self.iterations = np.zeros(k, dtype=int)
+        self.costs = np.full((n_iterations, k), np.nan)
+        # Sampled iterations are the same for every candidate: one row of normalized θ per sampled iteration
+        self.sampling = sampling
+        self.sample_iterations = np.flatnonzero(sampling_mask(sampling, 0, n_iterations))
+        self._sample_row = np.full(n_iterations, -1)
+        self._sample_row[self.sample_iterations] = np.arange(len(self.sample_iterations))
+        self.sample_theta0 = np.full((len(self.sample_iterations), k), np.nan)
+        self.sample_theta1 = np.full((len(self.sample_iterations), k), np.nan)
+        self.scaler_x = ManualScaler()
+        self.scaler_y = ManualScaler()
+        self._prev_cost = np.full(k, np.inf)
 
-    best_lr, best_score = 0.01, -1
+    def _scale(self):
+        """(mean_x, std_x, mean_y, std_y) of the shared scalers."""
+        return self.scaler_x.mean_, self.scaler_x.std_, self.scaler_y.mean_, self.scaler_y.std_
 
-    for lr in learning_rates:
-        try:
-            model = LinearRegression(learning_rate=lr, n_iterations=1000)
-            model.fit(mileage, price, verbose=False)
+    def prepare(self, X, y, sample_weight=None):
+        """Normalize the data once; it is shared by every candidate. sample_weight works as in LinearRegression.fit."""
+        self._X_norm = self.scaler_x.fit_transform(X, sample_weight)
+        self._y_norm = self.scaler_y.fit_transform(y, sample_weight)
+        self._weights = None if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+        return self
+
+    def fit(self, X, y, sample_weight=None):
+        """Normalize the data once and train every candidate."""
+        return self.prepare(X, y, sample_weight).advance(self.n_iterations)
 
-            r_squared, _, iterations = calculate_metrics(model, mileage, price)
-            score = r_squared + max(0, (1000 - iterations) / 1000 * 0.01)
+    def advance(self, until):
+        """Run every active candidate until it has done `until` iterations (capped at n_iterations)."""
+        X_norm, y_norm, weights = self._X_norm, self._y_norm, self._weights
+        m, tolerance, max_gradient = len(X_norm) if weights is None else weights.sum(dtype=np.float64), 1e-6, 1e6
+        until = min(until, self.n_iterations)
 
-            if score > best_score:
-                best_score, best_lr = score, lr
-        except Exception:
-            continue
+        while True:
+            idx = np.flatnonzero(self.active & (self.iterations < until))
+            if idx.size == 0:
+                break
 
-    logger.info(f"Best learning rate found: {best_lr} (Score = {best_score:.4f})")
-    return best_lr
+            with np.errstate(over="ignore", invalid="ignore"):
+                sum_errors, sum_errors_x, sum_squared_errors = self._error_sums(idx, X_norm, y_norm, weights)
+                lr = self.learning_rates[idx]
+                self.theta0[idx] -= np.clip(lr * sum_errors / m, -max_gradient, max_gradient)
+                self.theta1[idx] -= np.clip(lr * sum_errors_x / m, -max_gradient, max_gradient)
+                cost = sum_squared_errors / m / 2
+
+            i = self.iterations[idx]
+            self.costs[i, idx] = cost
+            self.iterations[idx] += 1
+
+            bad = ~(np.isfinite(self.theta0[idx]) & np.isfinite(self.theta1[idx]) & np.isfinite(cost))
+            done = ~bad & (np.abs(self._prev_cost[idx] - cost) < tolerance)
+            self.diverged[idx[bad]] = True
+            self.converged[idx[done]] = True
+            self.active[idx[bad | done]] = False
+            self._prev_cost[idx] = cost
+
+            rows = self._sample_row[i]
+            store = (rows >= 0) & ~bad
+            self.sample_theta0[rows[store], idx[store]] = self.theta0[idx[store]]
+            self.sample_theta1[rows[store], idx[store]] = self.theta1[idx[store]]
+
+        self.active &= self.iterations < self.n_iterations
+        return self
 
+    def _error_sums(self, idx, X_norm, y_norm, weights):
+        """(3, candidates) Σerr, Σerr·x and Σerr² of the candidates idx (weighted when weights are given).
+
+        Errors are formed in the data's dtype, one block of rows at a time in two reused buffers; the
+        block sums are accumulated in float64.
+        """
+        dtype = X_norm.dtype
+        theta0, theta1 = self.theta0[idx, None].astype(dtype), self.theta1[idx, None].astype(dtype)
+        rows = min(max(1, BATCH_BLOCK_ELEMENTS // len(idx)), len(X_norm))
+        errors, product = np.empty((len(idx), rows), dtype=dtype), np.empty((len(idx), rows), dtype=dtype)
+        sums = np.zeros((3, len(idx)))
+        for start in range(0, len(X_norm), rows):
+            x, y = X_norm[start : start + rows], y_norm[start : start + rows]
+            block, weighted = errors[:, : len(x)], product[:, : len(x)]
+            np.multiply(theta1, x, out=block)
+            block += theta0
+            block -= y
+            if weights is None:
+                weighted = block
+            else:
+                np.multiply(block, weights[start : start + rows], out=weighted)
+            sums[0] += weighted.sum(axis=1, dtype=np.float64)
+            sums[1] += weighted @ x
+            sums[2] += np.einsum("ij,ij->i", weighted, block)
+        return sums
 
-def train_model(data_file):
-    """Train linear regression model with automatic hyperparameter optimization."""
-    mileage, price = load_data(data_file, for_training=True)
+    def cost_history(self, j):
+        """Cost per iteration of candidate j."""
+        return self.costs[: self.iterations[j], j]
 
-    if mileage is None or price is None:
-        raise ValueError("Failed to load training data")
+    def last_costs(self):
+        """Latest cost of every candidate (inf for diverged or not yet started ones)."""
+        last = self.costs[np.maximum(self.iterations - 1, 0), np.arange(len(self.learning_rates))]
+        return np.where(self.diverged | (self.iterations == 0), np.inf, last)
+
+    def to_model(self, j):
+        """Build a trained LinearRegression from candidate j without running it again."""
+        if self.diverged[j]:
+            raise ValueError(f"Learning rate {self.learning_rates[j]} diverged")
+
+        model = LinearRegression(learning_rate=self.learning_rates[j], n_iterations=self.n_iterations, sampling=self.sampling)
+        model.scaler_x, model.scaler_y = self.scaler_x, self.scaler_y
+        model.theta0, model.theta1 = self.theta0[j], self.theta1[j]
+        model.theta0_final, model.theta1_final = model._denormalize_parameters()
+
+        stored = ~np.isnan(self.sample_theta0[:, j])
+        model.trace = TrainingTrace.from_arrays(self.cost_history(j), self.sample_iterations[stored], self.sample_theta0[stored, j], self.sample_theta1[stored, j], self._scale(), self.sampling)
+        model.trace.finish(model.theta0, model.theta1)
+        return model
+
+
+def calculate_metrics(model, mileage, price, sample_weight=None):
+    """R², MSE and iteration count of a trained model, from one fused metrics pass."""
+    metrics = RegressionMetrics().update(mileage, price, model.theta0_final, model.theta1_final, sample_weight).result()
+    return metrics["r_squared"], metrics["mse"], len(model.cost_history)
+
+
+# Dense grid of the default search: BatchedLinearRegression reduces in row blocks of BATCH_BLOCK_ELEMENTS,
+# so the extra memory of all candidates stays at a few MB whatever the number of rows
+DEFAULT_LEARNING_RATES = np.logspace(-3, 0, 32)
+
+
+def _rank_candidates(batch, candidates, tolerance=1e-6):
+    """Order candidates by latest cost; costs within the convergence tolerance tie and fewer iterations win."""
+    cost_buckets = np.floor(batch.last_costs()[candidates] / tolerance)
+    return candidates[np.lexsort((batch.iterations[candidates], cost_buckets))]
+
+
+def optimize_hyperparameters(mileage, price, learning_rates=None, min_budget=16, max_iterations=1000, reduction=2, sample_weight=None):
+    """Find optimal learning rate with successive halving over a log-spaced grid.
+
+    Every learning rate first gets `min_budget` iterations; after each rung the worse half (by cost_history)
+    is dropped and the survivors' budget is multiplied by `reduction`, up to `max_iterations`. Diverged rates
+    are masked out as soon as they blow up. Returns the best learning rate and its already trained model
+    (None if every candidate diverged).
+    """
+    learning_rates = DEFAULT_LEARNING_RATES if learning_rates is None else learning_rates
+    logger.info(f"Optimizing hyperparameters ({len(learning_rates)} learning rates, successive halving)...")
+
+    batch = BatchedLinearRegression(learning_rates, n_iterations=max_iterations).prepare(mileage, price, sample_weight)
+    survivors = np.arange(len(batch.learning_rates))
+    budget = min_budget
+
+    while True:
+        batch.advance(budget)
+        survivors = survivors[~batch.diverged[survivors]]
+        if len(survivors) <= 1 or budget >= max_iterations or not np.any(batch.active[survivors]):
+            break
+
+        ranked = _rank_candidates(batch, survivors)
+        keep = max(1, int(np.ceil(len(ranked) / reduction)))
+        batch.active[ranked[keep:]] = False
+        survivors = np.sort(ranked[:keep])
+        logger.debug(f"Rung with budget {budget}: {len(survivors)} learning rates kept")
+        budget *= reduction
 
+    logger.debug(f"Learning rate search used {int(batch.iterations.sum())} candidate-iterations")
+
+    best_lr, best_score, best_model = 0.01, -1, None
+
+    for j in survivors:
+        model = batch.to_model(j)
+        r_squared, _, iterations = calculate_metrics(model, mileage, price, sample_weight)
+        score = r_squared + max(0, (max_iterations - iterations) / max_iterations * 0.01)
+
+        if score > best_score:
+            best_score, best_lr, best_model = score, float(batch.learning_rates[j]), model
+
+    logger.info(f"Best learning rate found: {best_lr:.4g} (Score = {best_score:.4f})")
+    return best_lr, best_model
+
+
+def _validate_training_data(mileage, price):
+    """Reject samples that cannot come from a valid listing."""
     if np.any(mileage < 0):
         raise ValueError("Invalid data: negative mileage values")
     if np.any(price <= 0):
         raise ValueError("Invalid data: non-positive price values")
 
-    best_lr = optimize_hyperparameters(mileage, price)
-    logger.info(f"Training model with learning rate {best_lr}...")
-    model = LinearRegression(learning_rate=best_lr, n_iterations=1000)
-    model.fit(mileage, price)
 
+# Momentum and Adam can change the cost very little while still far from the optimum,
+# so the other full-batch optimizers stop on the gradient norm (normalized units) instead of the cost change
+OPTIMIZER_GTOL = 1e-8
+
+
+def _configured_model(solver, optimizer, learning_rate, batch_size, lr_decay, workers=None):
+    """Model for the command line options, or None when plain full-batch gd should search its learning rate."""
+    if solver == "exact":
+        return LinearRegression(solver="exact")
+    if optimizer == "gd" and learning_rate is None and batch_size is None:
+        return None
+
+    options = {"optimizer": optimizer, "batch_size": batch_size, "lr_decay": lr_decay, "workers": workers}
+    if learning_rate is not None:
+        options["learning_rate"] = learning_rate
+    if optimizer != "gd" and batch_size is None:
+        options.update(tol=None, gtol=OPTIMIZER_GTOL)
+    return LinearRegression(**options)
+
+
+def train_model(data_file, stream=False, chunk_size=1_000_000, solver="gd", use_cache=True, plot=True, save_plot=None, plot_background=False, plot_all_points=False, save_trace=None, optimizer="gd", learning_rate=None, batch_size=None, lr_decay=0.0, workers=None, shards=None, incremental=False, training_cache=True, group_column=None, cv_folds=None, compress=False, dtype="float64"):
+    """Train linear regression model with automatic hyperparameter optimization.
+
+    The learning rate search only runs for plain full-batch "gd" without an explicit learning_rate.
+    Other full-batch optimizers stop on the gradient norm; batch_size switches to mini-batch SGD with
+    lr_decay as the inverse-time decay of the step size. With use_cache, data is read from the
+    memory-mapped binary cache next to the CSV instead of re-parsing it. plot=False skips plotting;
+    save_plot writes the figure to a file instead of opening a window. save_trace is a path prefix
+    for the .npy export of the training trace. workers is the number of threads for the gradient reductions.
+    shards is a glob pattern of CSV files trained on together by `workers` processes instead of data_file.
+    incremental only parses the rows appended to data_file since the last checkpoint (see checkpoint.py).
+    With training_cache, a run on identical data, code and settings reuses the stored result (see training_cache.py).
+    With group_column, one model per segment id of that column is fitted (see segments.py) and the
+    (segment_ids, theta0, theta1) arrays are returned instead.
+    cv_folds picks the searched learning rate by k-fold held-out MSE instead of in-sample R² (in-memory training only).
+    compress collapses duplicate rows into weighted samples before in-memory training (see compression.py);
+    the result matches training on the raw rows.
+    dtype="float32" stores the data and computes the gradient terms in float32 with float64 reductions
+    (in-memory training only; see precision.py for the drift against float64).
+    """
+    plot_options = {"save_path": save_plot, "background": plot_background, "all_points": plot_all_points} if plot else None
+    if group_column is not None:
+        return _train_segments(data_file, group_column, solver, learning_rate, plot_options)
+    if incremental:
+        return _train_model_incremental(data_file, chunk_size, plot_options, save_trace)
+    if shards:
+        return _train_model_sharded(shards, use_cache, plot_options, save_trace, _configured_model(solver, optimizer, learning_rate, batch_size, lr_decay), workers)
+
+    cache = TrainingCache() if training_cache else None
+    if cache is not None:
+        config = {"stream": stream, "chunk_size": chunk_size if stream else None, "solver": solver, "optimizer": optimizer, "learning_rate": learning_rate, "batch_size": batch_size, "lr_decay": lr_decay, "cv_folds": cv_folds, "compress": compress, "dtype": dtype}
+        key = cache.key(data_file, config)
+        state = cache.load(key)
+        if state is not None:
+            model = LinearRegression.from_state(state)
+            logger.info(f"Training cache hit ({key[:12]}): learning rate {model.learning_rate:.4g}, {len(model.cost_history)} iterations")
+            plot_data = _plot_sample(data_file, stream, chunk_size, use_cache) if plot_options is not None else None
+            return _finish_training(model, save_trace, plot_options, plot_data)
+
+    model = _configured_model(solver, optimizer, learning_rate, batch_size, lr_decay, workers)
+    if stream:
+        if dtype != "float64":
+            logger.info("Streaming training reads float64 chunks; dtype only applies to in-memory training")
+        model, plot_data = _fit_stream(data_file, chunk_size, use_cache, model, workers)
+    else:
+        model, plot_data = _fit_in_memory(data_file, use_cache, model, cv_folds, workers, compress, dtype)
+
+    if cache is not None:
+        cache.store(key, model.to_state())
+    return _finish_training(model, save_trace, plot_options, plot_data)
+
+
+def _fit_in_memory(data_file, use_cache, model, cv_folds=None, workers=None, compress=False, dtype="float64"):
+    """Fit the configured model, or run the learning rate search (cross-validated with cv_folds); returns (model, (mileage, price))."""
+    weights = None
+    if compress:
+        mileage, price, weights = load_data(data_file, for_training=True, use_cache=use_cache, compress=True, dtype=dtype)
+    else:
+        mileage, price = load_data(data_file, for_training=True, use_cache=use_cache, dtype=dtype)
+
+    if mileage is None or price is None:
+        raise ValueError("Failed to load training data")
+
+    _validate_training_data(mileage, price)
+
+    if model is None and cv_folds:
+        # Folds are drawn over raw rows, so compressed rows are expanded again for cross-validation
+        rows = (mileage, price) if weights is None else (np.repeat(mileage, weights.astype(np.int64)), np.repeat(price, weights.astype(np.int64)))
+        best_lr = select_learning_rate(*rows, folds=cv_folds, workers=workers)
+        if best_lr is None:
+            raise ValueError("Training diverged for every learning rate")
+        model = LinearRegression(learning_rate=best_lr, n_iterations=1000, workers=workers)
+
+    if model is not None:
+        model.fit(mileage, price, sample_weight=weights)
+    else:
+        best_lr, model = optimize_hyperparameters(mileage, price, sample_weight=weights)
+        if model is None:
+            raise ValueError("Training diverged for every learning rate")
+        logger.info(f"Using model trained with learning rate {best_lr:.4g} ({len(model.cost_history)} iterations)")
+
+    return model, (mileage, price)
+
+
+def _plot_sample(data_file, stream, chunk_size, use_cache):
+    """Data drawn by the training plots: the whole dataset, or the first chunk in streaming mode."""
+    if stream:
+        return next(iter(iter_data_chunks(data_file, chunk_size)))
+    mileage, price = load_data(data_file, use_cache=use_cache)
+    if mileage is None:
+        raise ValueError("Failed to load training data")
+    return mileage, price
+
+
+def _finish_training(model, save_trace, plot_options, plot_data):
+    """Save the parameters and trace, plot, and return (θ₀, θ₁) on the original scale."""
     model.save_model()
-    model.plot_results(mileage, price)
+    _save_trace(model, save_trace)
+    if plot_options is not None:
+        model.plot_results(*plot_data, **plot_options)
 
     return model.theta0_final, model.theta1_final
 
 
-def train():
+def _save_trace(model, prefix):
+    """Export the training trace to <prefix>.costs.npy / <prefix>.thetas.npy when a prefix is given."""
+    if prefix:
+        costs_path, thetas_path = model.trace.save(prefix)
+        logger.info(f"Training trace saved to {costs_path} and {thetas_path}")
+
+
+def _train_segments(data_file, group_column, solver, learning_rate, plot_options):
+    """Fit every segment of data_file in one vectorized model and save them to the segment model store."""
+    mileage, price, groups = load_data(data_file, for_training=True, group_column=group_column)
+    if mileage is None:
+        raise ValueError("Failed to load training data")
+    _validate_training_data(mileage, price)
+
+    model = SegmentedRegression(solver=solver, learning_rate=learning_rate or 0.5).fit(mileage, price, groups)
+    model.save(SEGMENT_MODELS_FILE)
+    if plot_options is not None:
+        logger.info("Plots are skipped for per-segment training")
+    return model.segment_ids, model.theta0, model.theta1
+
+
+def _train_model_incremental(data_file, chunk_size, plot_options, save_trace, model_file="model_params.json"):
+    """Fold the rows appended since the checkpoint into its statistics and re-solve; the whole file on the first run."""
+    checkpoint_file = checkpoint_path(model_file)
+    model = LinearRegression(solver="exact")
+    offset, line = 0, 1
+    resumed = load_checkpoint(checkpoint_file, data_file)
+    if resumed is not None:
+        model.stats, offset, line = resumed
+
+    # Whole lines only: a row still being appended is picked up by the next run
+    stop = whole_lines_end(data_file)
+    n_before = model.stats.n
+    for mileage, price in iter_data_chunks(data_file, chunk_size, start=offset, stop=stop, first_line=line):
+        _validate_training_data(mileage, price)
+        model.partial_fit(mileage, price, verbose=False)
+    # Solve even when nothing was appended (the model file may have been removed)
+    model.partial_fit(np.empty(0), np.empty(0), verbose=False)
+    if model.stats.n < 2:
+        raise ValueError("Insufficient data for training")
+    logger.info(f"Incremental update: {model.stats.n - n_before} new rows from byte {offset}, {model.stats.n} samples in total")
+
+    model.save_model(model_file)
+    save_checkpoint(checkpoint_file, data_file, model.stats, stop, line + count_lines(data_file, start=offset, stop=stop))
+    _save_trace(model, save_trace)
+    if plot_options is not None:
+        logger.info("Plots are skipped in incremental mode (earlier rows are not read)")
+
+    return model.theta0_final, model.theta1_final
+
+
+def _train_model_sharded(pattern, use_cache, plot_options, save_trace, model, workers=None):
+    """Train on every CSV matching pattern; without a configured model the learning rate is searched on the first shard."""
+    paths = shard_paths(pattern)
+    sample_mileage, sample_price = load_data(paths[0], use_cache=use_cache)
+    if sample_mileage is None:
+        raise ValueError(f"Failed to load shard '{paths[0]}'")
+
+    if model is None:
+        best_lr, _ = optimize_hyperparameters(sample_mileage, sample_price)
+        logger.info(f"Sharded training with learning rate {best_lr:.4g}...")
+        model = LinearRegression(learning_rate=best_lr, n_iterations=1000)
+    with ShardedDataset(paths, workers, use_cache) as shards:
+        model.fit_sharded(shards)
+    return _finish_training(model, save_trace, plot_options, (sample_mileage, sample_price))
+
+
+def _fit_stream(data_file, chunk_size, use_cache, model, workers=None):
+    """Train chunk by chunk; without a configured model the learning rate is searched on the first chunk only.
+
+    Returns (model, first chunk). Epochs slice the memory-mapped cache when available (built once, chunk by chunk), else re-read the CSV.
+    """
+    data = load_cached_data(data_file, chunk_size) if use_cache else None
+
+    def chunks():
+        if data is not None:
+            source = ((data[0, start : start + chunk_size], data[1, start : start + chunk_size]) for start in range(0, data.shape[1], chunk_size))
+        else:
+            source = iter_data_chunks(data_file, chunk_size)
+        for mileage, price in source:
+            _validate_training_data(mileage, price)
+            yield mileage, price
+
+    sample_mileage, sample_price = next(iter(chunks()), (None, None))
+    if sample_mileage is None or len(sample_mileage) < 2:
+        raise ValueError("Insufficient data for training")
+
+    if model is None:
+        best_lr, _ = optimize_hyperparameters(sample_mileage, sample_price)
+        logger.info(f"Streaming training with learning rate {best_lr:.4g} (chunk size {chunk_size})...")
+        model = LinearRegression(learning_rate=best_lr, n_iterations=1000, workers=workers)
+    model.fit_stream(chunks)
+    return model, (sample_mileage, sample_price)
+
+
+def parse_args(argv=None):
+    """Parse command line options for training."""
+    parser = argparse.ArgumentParser(description="Train the linear regression model.")
+    parser.add_argument("--stream", action="store_true", help="read the CSV in chunks instead of loading it into memory")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows per chunk in streaming mode (default: 1000000)")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the CSV instead of using the binary data cache")
+    parser.add_argument("--solver", choices=SOLVERS, default="gd", help="gd: gradient descent with learning rate search; exact: closed-form least squares in one pass")
+    parser.add_argument("--optimizer", choices=OPTIMIZERS, default="gd", help="update rule for --solver gd; anything but gd skips the learning rate search (default: gd)")
+    parser.add_argument("--learning-rate", type=float, help="fixed (initial) step size instead of the learning rate search")
+    parser.add_argument("--batch-size", type=int, help="mini-batch SGD with this many rows per step (shuffled every epoch)")
+    parser.add_argument("--lr-decay", type=float, default=0.0, help="mini-batch step size decay: lr / (1 + decay * epoch) (default: 0)")
+    parser.add_argument("--group-column", metavar="COLUMN", help=f"fit one model per numeric segment id in this column (name or index) and save them to {SEGMENT_MODELS_FILE}")
+    parser.add_argument("--no-training-cache", action="store_true", help="always train instead of reusing a cached result for the same data, code and settings")
+    parser.add_argument("--incremental", action="store_true", help="only read rows appended since the last run (checkpoint next to model_params.json); exact solution")
+    parser.add_argument("--shards", metavar="GLOB", help='train on every CSV matching GLOB (e.g. "data/*.csv") with a process pool instead of data.csv')
+    parser.add_argument("--workers", type=int, help="threads for the chunked gradient reductions, or processes with --shards (default: all cores)")
+    parser.add_argument("--cv-folds", type=int, metavar="K", help="choose the searched learning rate by K-fold cross-validated MSE (process pool) instead of in-sample R²")
+    parser.add_argument("--compress", action="store_true", help="collapse duplicate rows into weighted samples before training (same result, less work on repetitive data)")
+    parser.add_argument("--dtype", choices=DTYPES, default="float64", help="storage and compute dtype of in-memory training; float32 halves memory, reductions stay float64 (default: float64)")
+    parser.add_argument("--save-trace", metavar="PREFIX", help="export the training trace to PREFIX.costs.npy and PREFIX.thetas.npy")
+    add_plot_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def train(argv=None):
     """Main function to train the model and handle errors."""
+    args = parse_args(argv)
     try:
-        theta0, theta1 = train_model("data.csv")
+        result = train_model("data.csv", stream=args.stream, chunk_size=args.chunk_size, solver=args.solver, use_cache=not args.no_cache, plot=not args.no_plot, save_plot=args.save_plot, plot_background=args.plot_background, plot_all_points=args.plot_all_points, save_trace=args.save_trace, optimizer=args.optimizer, learning_rate=args.learning_rate, batch_size=args.batch_size, lr_decay=args.lr_decay, workers=args.workers, shards=args.shards, incremental=args.incremental, training_cache=not args.no_training_cache, group_column=args.group_column, cv_folds=args.cv_folds, compress=args.compress, dtype=args.dtype)
         print("\nTraining successful!")
+        if args.group_column is not None:
+            print(f"{len(result[0])} segment models saved to {SEGMENT_MODELS_FILE}")
+            return 0
+        theta0, theta1 = result
         print(f"Model parameters: θ₀ = {theta0:.6f}, θ₁ = {theta1:.6f}")
         print("Parameters saved to model_params.json")
         print("Use 'python evaluate.py' to calculate precision metrics.")
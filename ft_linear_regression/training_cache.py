@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of training results.
+A run is keyed on the SHA-256 of the training data, the training code and the solver/hyperparameter
+settings; a hit returns the stored parameters, learning rate and trace without training again.
+Entries are .npz files in a directory bounded in size with least-recently-used eviction.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from utils import data_digest
+from logging_config import get_logger
+
+# Setup logger for training cache module
+logger = get_logger(__name__)
+
+TRAINING_CACHE_DIR = ".training_cache"
+DEFAULT_MAX_BYTES = 64 << 20
+TRAINING_CACHE_VERSION = 1
+
+# Modules whose code determines a training result
+TRAINING_MODULES = ("train.py", "optimizers.py", "reductions.py", "stats.py", "training_trace.py", "metrics.py", "cross_validation.py", "compression.py", "csv_reader.py", "utils.py")
+
+
+def code_digest():
+    """SHA-256 over the source of the training modules, so a code change invalidates every entry."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in TRAINING_MODULES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class TrainingCache:
+    """Directory of `<key>.npz` training results, evicted least recently used first beyond max_bytes.
+
+    Recency is the file's mtime, refreshed on every hit (atime is often disabled).
+    """
+
+    def __init__(self, directory=TRAINING_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, data_file, config):
+        """Hex key of a run on data_file with the given (JSON-serializable) settings."""
+        payload = {"version": TRAINING_CACHE_VERSION, "data": data_digest(data_file), "code": code_digest(), "config": config}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def load(self, key):
+        """Stored arrays for key (and mark them recently used), or None on a miss or unreadable entry."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                state = {name: entry[name] for name in entry.files}
+            os.utime(path)
+            return state
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f"Dropping unreadable training cache entry '{path}': {e}")
+            self._remove(path)
+            return None
+
+    def store(self, key, state):
+        """Write an entry atomically, then evict old entries; failures only log a warning."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **state)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except OSError as e:
+            logger.warning(f"Could not store training result in '{self.directory}': {e}")
+
+    def evict(self):
+        """Remove least recently used entries until the total size fits max_bytes (the newest entry is kept)."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort(reverse=True)
+
+        total = 0
+        for i, (_, size, path) in enumerate(entries):
+            total += size
+            if total > self.max_bytes and i > 0:
+                self._remove(path)
+                logger.debug(f"Evicted training cache entry '{path}'")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
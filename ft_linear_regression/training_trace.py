@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compact record of a gradient descent run.
+Costs and sampled parameters are kept in preallocated float64 arrays and exported as .npy files,
+so long runs can be inspected without keeping or pickling Python lists.
+"""
+
+import numpy as np
+
+
+def default_sampling(i):
+    """Parameter sampling schedule: dense early iterations, sparse later ones."""
+    return i == 0 or (i < 10 and i % 2 == 0) or (i < 50 and i % 5 == 0) or (i < 200 and i % 20 == 0) or (i % 50 == 0)
+
+
+def sample_every(step):
+    """Sampling policy keeping the parameters of every step-th iteration."""
+    return lambda i: i % step == 0
+
+
+def sampling_mask(sampling, start, stop):
+    """Boolean mask of the iterations in [start, stop) selected by a sampling policy."""
+    return np.fromiter((sampling(i) for i in range(start, stop)), dtype=bool, count=stop - start)
+
+
+def denormalize(theta0, theta1, mean_x, std_x, mean_y, std_y):
+    """Closed-form conversion of normalized (θ₀, θ₁) to the original scale; works elementwise on arrays."""
+    theta1_final = theta1 * std_y / std_x
+    return mean_y + std_y * theta0 - theta1_final * mean_x, theta1_final
+
+
+class TrainingTrace:
+    """Cost of every iteration and (θ₀, θ₁) of sampled iterations in growable preallocated arrays.
+
+    Parameters are stored in normalized space; `scale` holds (mean_x, std_x, mean_y, std_y) and they
+    are converted to the original scale in one vectorized step when read.
+    """
+
+    def __init__(self, capacity=1024, sampling=default_sampling):
+        self.sampling = sampling
+        self.scale = (0.0, 1.0, 0.0, 1.0)
+        self.length = 0
+        self.n_samples = 0
+        self._capacity = max(capacity, 1)
+        self._costs = np.empty(self._capacity)
+        # Plain list: indexing it in record() is several times cheaper than indexing a NumPy bool array
+        self._sampled = sampling_mask(sampling, 0, self._capacity).tolist()
+        self._samples = np.empty((3, sum(self._sampled) + 1))
+
+    def _grow(self):
+        capacity = self._capacity
+        self._costs = np.concatenate([self._costs, np.empty(capacity)])
+        self._sampled += sampling_mask(self.sampling, capacity, 2 * capacity).tolist()
+        self._capacity = 2 * capacity
+
+    def _add_sample(self, iteration, theta0, theta1):
+        if self.n_samples == self._samples.shape[1]:
+            self._samples = np.concatenate([self._samples, np.empty((3, max(self.n_samples, 1)))], axis=1)
+        self._samples[:, self.n_samples] = iteration, theta0, theta1
+        self.n_samples += 1
+
+    def record(self, cost, theta0, theta1):
+        """Append the cost of the next iteration; normalized parameters are kept if the policy samples it."""
+        i = self.length
+        if i == self._capacity:
+            self._grow()
+        self._costs[i] = cost
+        if self._sampled[i]:
+            self._add_sample(i, theta0, theta1)
+        self.length = i + 1
+
+    def finish(self, theta0, theta1):
+        """Make sure the last recorded iteration has a parameter sample."""
+        last = self.length - 1
+        if last >= 0 and (self.n_samples == 0 or self._samples[0, self.n_samples - 1] != last):
+            self._add_sample(last, theta0, theta1)
+
+    @property
+    def costs(self):
+        """Cost per iteration (a view, no copy)."""
+        return self._costs[: self.length]
+
+    def samples(self):
+        """Sampled (iterations, θ₀, θ₁) arrays on the original scale."""
+        iterations, theta0, theta1 = self._samples[:, : self.n_samples]
+        return (iterations.astype(np.int64), *denormalize(theta0, theta1, *self.scale))
+
+    def history(self):
+        """Sampled parameters as a list of (iteration, θ₀, θ₁) tuples."""
+        iterations, theta0, theta1 = self.samples()
+        return list(zip(iterations.tolist(), theta0.tolist(), theta1.tolist()))
+
+    @classmethod
+    def from_arrays(cls, costs, iterations, theta0, theta1, scale, sampling=default_sampling):
+        """Build a trace from recorded costs and normalized parameter samples."""
+        trace = cls(len(costs), sampling)
+        trace._costs[: len(costs)] = costs
+        trace.length = len(costs)
+        trace._samples = np.vstack([iterations, theta0, theta1]).astype(float)
+        trace.n_samples = len(iterations)
+        trace.scale = tuple(scale)
+        return trace
+
+    def to_arrays(self):
+        """(costs, iterations, θ₀, θ₁, scale) with normalized parameters, the arguments of from_arrays."""
+        iterations, theta0, theta1 = self._samples[:, : self.n_samples]
+        return self.costs.copy(), iterations.astype(np.int64), theta0.copy(), theta1.copy(), np.array(self.scale)
+
+    def save(self, prefix):
+        """Write `<prefix>.costs.npy` and `<prefix>.thetas.npy` (rows: iteration, θ₀, θ₁); returns both paths."""
+        iterations, theta0, theta1 = self.samples()
+        paths = f"{prefix}.costs.npy", f"{prefix}.thetas.npy"
+        np.save(paths[0], self.costs)
+        np.save(paths[1], np.vstack([iterations, theta0, theta1]))
+        return paths
@@ -4,8 +4,14 @@ Common utilities for linear regression project.
 Shared functions used across train.py, predict.py, and evaluate.py.
 """
 
+import hashlib
 import json
+import os
+import shutil
+import tempfile
 import numpy as np
+from compression import compress_samples
+from csv_reader import column_index, iter_csv_blocks, read_csv_columns, report_errors
 from logging_config import get_logger
 
 # Setup logger for utils module
@@ -29,6 +35,26 @@ def estimate_price(mileage, theta0, theta1):
     return price
 
 
+def estimate_prices(mileage, theta0, theta1):
+    """Vectorized estimate_price over an array of mileages.
+
+    Returns (prices, valid): rows with a non-finite or negative mileage, or a non-finite price, are
+    flagged invalid in the boolean mask and set to NaN instead of raising.
+    """
+    if not isinstance(theta0, (int, float)) or not np.isfinite(theta0):
+        raise ValueError("Invalid theta0 parameter")
+    if not isinstance(theta1, (int, float)) or not np.isfinite(theta1):
+        raise ValueError("Invalid theta1 parameter")
+
+    mileage = np.asarray(mileage, dtype=np.float64)
+    with np.errstate(invalid="ignore", over="ignore"):
+        valid = np.isfinite(mileage) & (mileage >= 0)
+        prices = theta0 + theta1 * mileage
+        valid &= np.isfinite(prices)
+    prices[~valid] = np.nan
+    return prices, valid
+
+
 def load_model_params(filename="model_params.json"):
     """Load trained model parameters from JSON file."""
     try:
@@ -52,11 +78,29 @@ def load_model_params(filename="model_params.json"):
         return None
 
 
-def load_data(data_file="data.csv", for_training=False):
-    """Load training data from CSV file with 'km' and 'price' columns."""
+# Storage dtypes of loaded data; float32 halves memory, reductions stay float64 (see ManualScaler, FusedReducer)
+DTYPES = ("float64", "float32")
+
+
+def load_data(data_file="data.csv", for_training=False, use_cache=True, group_column=None, compress=False, dtype="float64"):
+    """Load training data from CSV file with 'km' and 'price' columns.
+
+    With use_cache, the columns come from a memory-mapped binary sidecar cache (see load_cached_data)
+    that is rebuilt whenever the CSV changes; if the cache cannot be written the CSV is parsed directly.
+    With group_column (a header name or column index holding numeric segment ids), returns
+    (mileage, price, groups) parsed straight from the CSV instead. With compress, duplicate rows are
+    collapsed and (distinct mileage, distinct price, counts as weights) is returned (see compression.py).
+    dtype is the dtype of the returned mileage and price (one of DTYPES); weights stay float64.
+    """
+    failure = (None, None, None) if group_column is not None or compress else (None, None)
     try:
-        data = np.loadtxt(data_file, delimiter=",", skiprows=1, usecols=(0, 1))
-        mileage, price = data[:, 0], data[:, 1]
+        if compress and group_column is not None:
+            raise ValueError("Duplicate compression does not support group columns")
+        data = load_cached_data(data_file) if use_cache and group_column is None else None
+        if data is None:
+            usecols = (0, 1) if group_column is None else (0, 1, column_index(data_file, group_column))
+            data, _ = read_csv_columns(data_file, usecols=usecols)
+        mileage, price = data[0].astype(dtype, copy=False), data[1].astype(dtype, copy=False)
 
         min_samples = 2 if not for_training else 2
         error_msg = "Insufficient data for training" if for_training else "Insufficient valid data"
@@ -69,10 +113,142 @@ def load_data(data_file="data.csv", for_training=False):
         else:
             logger.debug(f"Data loaded: {len(mileage)} samples")
 
-        return mileage, price
+        if compress:
+            mileage, price, weights = compress_samples(mileage, price)
+            mileage, price = mileage.astype(dtype), price.astype(dtype)
+            logger.info(f"Compressed into {len(weights)} distinct rows")
+            return mileage, price, weights
+        return (mileage, price) if group_column is None else (mileage, price, data[2])
     except FileNotFoundError:
         logger.error(f"Data file '{data_file}' not found")
-        return None, None
+        return failure
     except Exception as e:
         logger.error(f"Error loading data: {e}")
-        return None, None
+        return failure
+
+
+def iter_data_chunks(data_file="data.csv", chunk_size=1_000_000, start=0, stop=None, first_line=1):
+    """Yield (mileage, price) arrays of about chunk_size rows, parsing the CSV block by block.
+
+    Malformed rows are skipped and reported with their line numbers once the file has been read.
+    start/stop limit parsing to a byte range of whole lines starting at line number first_line.
+    """
+    if chunk_size <= 0:
+        raise ValueError("Chunk size must be positive")
+
+    with open(data_file, "rb") as f:
+        f.readline()
+        sample = f.read(1 << 16)
+    bytes_per_row = max(len(sample) / max(sample.count(b"\n"), 1), 1.0)
+
+    errors = []
+    for values, block_errors in iter_csv_blocks(data_file, block_bytes=max(int(chunk_size * bytes_per_row), 1 << 12), start=start, stop=stop, first_line=first_line):
+        errors.extend(block_errors)
+        if len(values):
+            logger.debug(f"Chunk loaded: {len(values)} rows")
+            yield values[:, 0], values[:, 1]
+    report_errors(data_file, errors)
+
+
+CACHE_VERSION = 1
+
+
+def cache_paths(data_file):
+    """Sidecar cache files for a CSV: the (2, n) float64 .npy array and its JSON metadata."""
+    directory, name = os.path.split(os.path.abspath(data_file))
+    return os.path.join(directory, f".{name}.cache.npy"), os.path.join(directory, f".{name}.cache.json")
+
+
+def file_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def data_digest(data_file):
+    """SHA-256 of a CSV, taken from its binary cache metadata while size and mtime still match."""
+    _, meta_file = cache_paths(data_file)
+    try:
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        meta = {}
+    stat = os.stat(data_file)
+    if meta.get("version") == CACHE_VERSION and meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+        return meta["sha256"]
+    return file_digest(data_file)
+
+
+def _cache_is_valid(data_file, meta_file):
+    """Check the cache key: size and mtime first, content hash only when the mtime alone changed."""
+    try:
+        with open(meta_file, "r") as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+    stat = os.stat(data_file)
+    if meta.get("version") != CACHE_VERSION or meta.get("size") != stat.st_size:
+        return False
+    if meta.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    if file_digest(data_file) != meta.get("sha256"):
+        return False
+
+    # Same content with a new mtime (touch, checkout): refresh the key instead of rebuilding
+    meta["mtime_ns"] = stat.st_mtime_ns
+    write_json_atomic(meta_file, meta)
+    return True
+
+
+def write_json_atomic(filename, payload):
+    """Write JSON to a temporary file and atomically rename it over filename."""
+    tmp_filename = f"{filename}.tmp"
+    with open(tmp_filename, "w") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_filename, filename)
+
+
+def _build_cache(data_file, cache_file, meta_file, chunk_size):
+    """Parse the CSV chunk by chunk into a (2, n) .npy file without holding the whole dataset in memory."""
+    stat = os.stat(data_file)
+    digest = file_digest(data_file)
+    n_rows = 0
+
+    with tempfile.TemporaryFile() as mileage_tmp, tempfile.TemporaryFile() as price_tmp:
+        for mileage, price in iter_data_chunks(data_file, chunk_size):
+            mileage_tmp.write(mileage.astype("<f8").tobytes())
+            price_tmp.write(price.astype("<f8").tobytes())
+            n_rows += len(mileage)
+
+        tmp_cache = f"{cache_file}.tmp"
+        with open(tmp_cache, "wb") as out:
+            np.lib.format.write_array_header_1_0(out, {"descr": "<f8", "fortran_order": False, "shape": (2, n_rows)})
+            for column in (mileage_tmp, price_tmp):
+                column.seek(0)
+                shutil.copyfileobj(column, out, 1 << 20)
+        os.replace(tmp_cache, cache_file)
+
+    write_json_atomic(meta_file, {"version": CACHE_VERSION, "source": os.path.basename(data_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest, "rows": n_rows})
+    logger.debug(f"Data cache written: {cache_file} ({n_rows} rows)")
+
+
+def load_cached_data(data_file="data.csv", chunk_size=1_000_000):
+    """Return a read-only memory-mapped (2, n) array of the km and price columns, or None if caching failed.
+
+    The cache is a sidecar .npy next to the CSV, keyed on the CSV's size, mtime and SHA-256; it is
+    (re)built from the CSV when missing or stale.
+    """
+    cache_file, meta_file = cache_paths(data_file)
+    try:
+        if not (os.path.exists(cache_file) and _cache_is_valid(data_file, meta_file)):
+            _build_cache(data_file, cache_file, meta_file, chunk_size)
+        return np.asarray(np.load(cache_file, mmap_mode="r"))
+    except FileNotFoundError:
+        raise
+    except (OSError, ValueError) as e:
+        logger.debug(f"Data cache unavailable for '{data_file}': {e}")
+        return None